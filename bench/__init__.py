@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the bot modules live in the repository root, the suite is run as `python -m bench` from there
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from bench import ROOT, bot, micro
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks the bot without Discord or a token.")
+    parser.add_argument("--level", type=int, default=10, help="level of the synthetic farms")
+    parser.add_argument("--farms", type=int, default=50, help="number of synthetic farms")
+    parser.add_argument("--iterations", type=int, default=200, help="messages per command")
+    parser.add_argument("--only", choices=("commands", "micro"), help="run just one part of the suite")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_output.json"), help="where the json results go")
+    return parser.parse_args()
+
+
+async def run_commands(args) -> dict:
+    main = bot.load_bot()
+
+    try:
+        return await bot.run(main, args.level, args.farms, args.iterations)
+    finally:
+        main.farms.close()
+        main.logger.close()
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output)
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": numpy.__version__ if numpy is not None else None,
+            "level": args.level,
+            "farms": args.farms,
+            "iterations": args.iterations
+        }
+    }
+
+    with tempfile.TemporaryDirectory(prefix="theseus-bench-") as directory:
+        os.chdir(directory)
+
+        if args.only != "micro":
+            results["commands"] = asyncio.run(run_commands(args))
+            results["skipped"] = bot.SKIPPED
+
+        if args.only != "commands":
+            results["micro"] = micro.run(args.level, directory)
+
+        os.chdir(ROOT)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for section in ("commands", "micro"):
+        for name, result in results.get(section, {}).items():
+            if section == "commands":
+                print(f"{name:<36}{result['ops_per_sec']:>12.1f} ops/s  p50 {result['p50_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms")
+            else:
+                print(f"{name:<36}{result['ops_per_sec']:>12.1f} ops/s  best {result['best_us']:>10.2f}us")
+
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
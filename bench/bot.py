@@ -0,0 +1,130 @@
+import importlib
+import time
+
+from bench.fakes import FakeMessage, FakeUser, make_farm
+from bench.timing import summarize
+
+
+FIRST_USER = 10 ** 6
+NEW_USER = 10 ** 9  # farms created by the create benchmark start here, so they never collide
+TEST_USER = 843395659487117323  # upgradet and placet always work on this farm
+
+# commands that are not benchmarked, with the reason
+SKIPPED = {
+    "profile": "toggles cProfile, it would measure itself",
+    "memory": "toggles tracemalloc, it would measure itself"
+}
+
+
+def load_bot():
+    # main sets the bot up on import and only connects when run as a script,
+    # its files (farms.db, latest.log, ...) end up in the working directory, so change to a temporary one first
+    main = importlib.import_module("main")
+    main.logger.console_level = 3  # the file and json sinks stay on, like in production
+    return main
+
+
+class Scenario:
+
+    def __init__(self, name: str, content, user=None, after=None):
+        self.name = name
+        self.content = content  # message text, or callable(i) for text that changes per iteration
+        self.user = user  # callable(i) -> user id, defaults to the synthetic farms in turn
+        self.after = after  # callable(), undoes the command outside of the measured time
+
+    def get_content(self, i: int) -> str:
+        return self.content(i) if callable(self.content) else self.content
+
+
+def get_scenarios(main) -> list[Scenario]:
+    bot = main.bot
+
+    def reset_prefix():
+        bot.prefix = "="
+
+    return [
+        Scenario("help", "=help"),
+        Scenario("prefix", "=prefix =", after=reset_prefix),
+        Scenario("prefixspace", "=prefixspace =", after=reset_prefix),
+        Scenario("ping", "=ping"),
+        Scenario("create", "=create bench", user=lambda i: NEW_USER + i),
+        Scenario("create (existing)", "=create bench"),
+        Scenario("harvest", "=harvest"),
+        Scenario("rename_farm", lambda i: f"=rename_farm bench {i}"),
+        Scenario("ready", "=ready"),
+        Scenario("notify", "=notify"),
+        Scenario("get_harvestable", "=get_harvestable"),
+        Scenario("render", "=render"),
+        Scenario("render all", "=render all"),
+        Scenario("upgrade", "=upgrade"),
+        Scenario("place", "=place fill 0 0 1 1 corn"),
+        Scenario("sell", "=sell corn 1"),
+        Scenario("blueprint save", "=blueprint save bench 0 0 2 2", user=lambda i: TEST_USER),
+        Scenario("blueprint stamp", "=blueprint stamp bench 1 1"),
+        Scenario("blueprint stamp (dry)", "=blueprint stamp bench 1 1 dry"),
+        Scenario("blueprint list", "=blueprint list"),
+        Scenario("view_description", "=view_description"),
+        Scenario("set_description", lambda i: f"=set_description bench description {i % 2}"),
+        Scenario("top", "=top"),
+        Scenario("stats", "=stats"),
+        Scenario("upgradet", "=upgradet", user=lambda i: TEST_USER),
+        Scenario("placet", "=placet fill 0 0 1 1 corn", user=lambda i: TEST_USER),
+        Scenario("unknown command", "=nonexistent")
+    ]
+
+
+async def populate(main, level: int, user_ids):
+    # synthetic farms go through the bot's own store, so the cache and the leaderboard see them
+    for user_id in user_ids:
+        await main.farms.save(user_id, make_farm(level, seed=user_id))
+
+
+async def setup(main, level: int, count: int) -> list[int]:
+    users = [FIRST_USER + i for i in range(count)]
+
+    await populate(main, level, users + [TEST_USER])
+
+    main.bot.admins.update(users)
+    return users
+
+
+async def run(main, level: int, count: int, iterations: int) -> dict:
+    users = await setup(main, level, count)
+    scenarios = get_scenarios(main)
+
+    covered = {scenario.content.split()[0][1:] for scenario in scenarios if not callable(scenario.content)}
+    covered.update(scenario.name for scenario in scenarios)
+    missing = sorted({command.name for command in main.registry.ordered} - covered - set(SKIPPED))
+
+    if missing:
+        print(f"commands without a benchmark: {', '.join(missing)}")
+
+    results = {}
+
+    for scenario in scenarios:
+        print(f"command: {scenario.name}", flush=True)
+
+        samples = []
+        replies = 0
+        total = 0.0
+
+        for i in range(iterations):
+            user_id = scenario.user(i) if scenario.user is not None else users[i % len(users)]
+            message = FakeMessage(FakeUser(user_id), scenario.get_content(i))
+
+            start = time.perf_counter()
+            await main.bot.process_message(message)
+            elapsed = time.perf_counter() - start
+
+            samples.append(elapsed * 1000)
+            total += elapsed
+            replies += len(message.replies)
+
+            if scenario.after is not None:
+                scenario.after()
+
+        result = summarize(samples, total)
+        result["replies_per_op"] = round(replies / iterations, 2)  # 0 is only expected for silent ones (upgradet, unknown commands)
+        results[scenario.name] = result
+
+    return results
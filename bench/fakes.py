@@ -0,0 +1,74 @@
+import datetime
+import itertools
+import random
+
+import farm
+
+
+ids = itertools.count(1)
+
+
+class FakeUser:
+
+    def __init__(self, id: int, name: str = None, bot=False):
+        self.id = id
+        self.name = name if name is not None else f"user{id}"
+        self.bot = bot
+        self.avatar = None
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeChannel:
+
+    def __init__(self, id: int = None):
+        self.id = id if id is not None else next(ids)
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+        return FakeMessage(BOT_USER, content, self)
+
+
+class FakeMessage:
+    # enough of discord.Message for Bot.process_message, replies are recorded instead of sent
+
+    def __init__(self, author: FakeUser, content: str, channel: FakeChannel = None, guild=None):
+        self.id = next(ids)
+        self.author = author
+        self.content = content
+        self.channel = channel if channel is not None else FakeChannel()
+        self.guild = guild
+        self.replies = []
+
+    async def reply(self, content=None, **kwargs):
+        self.replies.append((content, kwargs))
+        return FakeMessage(BOT_USER, content, self.channel)
+
+    async def edit(self, content=None, **kwargs):
+        if content is not None:
+            self.content = content
+
+
+BOT_USER = FakeUser(0, "theseus", bot=True)
+
+PLANTABLE = [h for h in farm.Harvests if h.value.plantable in (farm.Plantable.PLANTABLE, farm.Plantable.CONSUMABLE_PLANTABLE)]
+
+
+def make_farm(level: int, name="bench", seed=None) -> farm.Farm:
+    # a farm of the given level, every tile planted and ready, with plenty of money and items
+    rng = random.Random(seed)
+
+    f = farm.Farm(name, level, datetime.datetime.now() - datetime.timedelta(days=3))
+    x, y = f.get_farm_length_from_level(level)
+    f.farm = farm.Grid((rng.choice(PLANTABLE) for _ in range(x * y)), int(f.last_harvest.timestamp()))
+
+    f.harvests = {h.value.name: 10 ** 6 for h in farm.Harvests if h.value.plantable != farm.Plantable.UNOBTAINABLE}
+    f.harvests["moneybag"] = 10 ** 12
+
+    return f
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+
+from bench import ROOT, bot
+from bench.fakes import FakeMessage, FakeUser
+from bench.timing import summarize
+
+
+# what players send, roughly, with relative weights
+MIX = (
+    ("=harvest", 30),
+    ("=render", 20),
+    ("=get_harvestable", 10),
+    ("=sell corn 1", 10),
+    ("=place fill 0 0 1 1 corn", 10),
+    ("=top", 5),
+    ("=view_description", 5),
+    ("=help", 5),
+    ("=upgrade", 5)
+)
+
+COMMAND_LOG = " issued the following command: "  # what Bot.process_message logs for every command
+
+
+def synthetic_trace(users: list[int], duration: float, rate: float, seed=None) -> list[tuple[float, int, str]]:
+    # every user sends commands as a poisson process with `rate` commands per second
+    rng = random.Random(seed)
+    contents = [content for content, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    trace = []
+
+    for user_id in users:
+        t = rng.expovariate(rate)
+
+        while t < duration:
+            trace.append((t, user_id, rng.choices(contents, weights)[0]))
+            t += rng.expovariate(rate)
+
+    trace.sort()
+    return trace
+
+
+def read_trace(filename: str) -> list[tuple[float, int, str]]:
+    # either [timestamp, user_id, content] per line (see --save-trace),
+    # or the bot's own latest.jsonl, where every command is a "... issued the following command: ..." record
+    trace = []
+
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+
+            if isinstance(record, list):
+                trace.append((float(record[0]), int(record[1]), record[2]))
+                continue
+
+            if "user_id" not in record or COMMAND_LOG not in record["message"]:
+                continue
+
+            timestamp = datetime.datetime.fromisoformat(record["timestamp"]).timestamp()
+            trace.append((timestamp, int(record["user_id"]), record["message"].split(COMMAND_LOG, 1)[1]))
+
+    if not trace:
+        return trace
+
+    trace.sort()
+    start = trace[0][0]
+    return [(timestamp - start, user_id, content) for timestamp, user_id, content in trace]
+
+
+def save_trace(trace: list[tuple[float, int, str]], filename: str):
+    with open(filename, "w", encoding="utf-8") as f:
+        for event in trace:
+            f.write(json.dumps(event) + "\n")
+
+
+class LagMonitor:
+    # sleeps `interval` over and over, anything slept beyond that is time the loop was busy elsewhere
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, (time.perf_counter() - start - self.interval) * 1000))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+async def replay(main, trace: list[tuple[float, int, str]], speed=1.0) -> dict:
+    # feeds the trace through on_message at `speed` times real time,
+    # latency is from on_message until the user's actor is done with the command, queueing included
+    latencies = []
+    handler = main.actors.handler
+
+    async def timed(message):
+        try:
+            await handler(message)
+        finally:
+            latencies.append((time.perf_counter() - message.sent_at) * 1000)
+
+    main.actors.handler = timed
+    monitor = LagMonitor()
+    cache = main.farms.store
+    writes = cache.writes
+    saves = main.stats.storage["save"].count if "save" in main.stats.storage else 0
+    active = 0
+
+    monitor.start()
+    start = time.perf_counter()
+
+    try:
+        for timestamp, user_id, content in trace:
+            delay = start + timestamp / speed - time.perf_counter()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            message = FakeMessage(FakeUser(user_id), content)
+            message.sent_at = time.perf_counter()
+            await main.on_message(message)
+            active = max(active, main.actors.get_active())
+
+        sent = time.perf_counter() - start
+        await main.actors.join()
+        elapsed = time.perf_counter() - start
+
+        # the cache writes in the background, one last flush so every save of this run is counted
+        await asyncio.get_running_loop().run_in_executor(None, cache.flush)
+    finally:
+        main.actors.handler = handler
+        await monitor.stop()
+
+    offered = trace[-1][0] / speed if trace else 0.0
+
+    return {
+        "events": len(trace),
+        "offered_per_sec": round(len(trace) / offered, 2) if offered else 0.0,
+        "completed_per_sec": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "send_seconds": round(sent, 3),
+        "drain_seconds": round(elapsed - sent, 3),
+        "max_active_actors": active,
+        "latency": summarize(latencies, elapsed),
+        "loop_lag": summarize(monitor.lags, elapsed),
+        "saves_per_sec": round((main.stats.storage["save"].count - saves) / elapsed, 2) if "save" in main.stats.storage else 0.0,
+        "writes_per_sec": round((cache.writes - writes) / elapsed, 2)
+    }
+
+
+def is_saturated(result: dict, slo: float) -> bool:
+    # falling over: the p99 misses the target or the bot keeps less than 95% of the offered pace
+    return result["latency"]["p99_ms"] > slo or result["completed_per_sec"] < 0.95 * result["offered_per_sec"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m bench.load",
+                                     description="Replays command traces through on_message and ramps the load until the bot falls over.")
+    parser.add_argument("--trace", help="replay this trace (latest.jsonl or --save-trace output) instead of synthetic users")
+    parser.add_argument("--users", default="10,50,100,250,500,1000", help="synthetic users per stage, comma separated")
+    parser.add_argument("--rate", type=float, default=0.2, help="commands per second per synthetic user")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of synthetic trace per stage")
+    parser.add_argument("--speed", default="1", help="replay speed(s), comma separated, stages for a --trace")
+    parser.add_argument("--level", type=int, default=10, help="level of the synthetic farms")
+    parser.add_argument("--slo", type=float, default=1000.0, help="p99 latency in ms a stage has to stay under")
+    parser.add_argument("--keep-going", action="store_true", help="run every stage, even after one fell over")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save-trace", help="also write the synthetic traces here, one stage after another")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_load.json"))
+    return parser.parse_args()
+
+
+async def run(args) -> list[dict]:
+    main = bot.load_bot()
+    speeds = [float(speed) for speed in args.speed.split(",")]
+
+    if args.trace is not None:
+        trace = read_trace(args.trace)
+        stages = [({"speed": speed}, trace, speed) for speed in speeds]
+        users = sorted({user_id for _, user_id, _ in trace})
+    else:
+        counts = [int(count) for count in args.users.split(",")]
+        users = [bot.FIRST_USER + i for i in range(max(counts))]
+        stages = [({"users": count, "rate": args.rate},
+                   synthetic_trace(users[:count], args.duration, args.rate, args.seed), speeds[0]) for count in counts]
+
+    if args.save_trace is not None:
+        # stages are laid out back to back, a replay of the file ramps the same way
+        save_trace([(timestamp + i * args.duration, user_id, content)
+                    for i, (_, trace, _) in enumerate(stages) for timestamp, user_id, content in trace], args.save_trace)
+
+    await bot.populate(main, args.level, users)
+    main.farms.store.flush()  # so the first stage doesn't count the synthetic farms as writes
+    results = []
+
+    try:
+        for stage, trace, speed in stages:
+            print(f"stage {stage}, {len(trace)} events at {speed}x", flush=True)
+
+            result = dict(stage, speed=speed, **await replay(main, trace, speed))
+            result["saturated"] = is_saturated(result, args.slo)
+            results.append(result)
+
+            print(f"  {result['completed_per_sec']:.1f}/{result['offered_per_sec']:.1f} commands/s, "
+                  f"p50 {result['latency']['p50_ms']:.1f}ms, p99 {result['latency']['p99_ms']:.1f}ms, "
+                  f"loop lag p99 {result['loop_lag']['p99_ms']:.1f}ms, {result['writes_per_sec']:.1f} writes/s", flush=True)
+
+            if result["saturated"] and not args.keep_going:
+                print("  fell over, stopping the ramp")
+                break
+    finally:
+        await main.actors.close()
+        main.farms.close()
+        main.logger.close()
+
+    return results
+
+
+def main():
+    args = parse_args()
+    output = os.path.abspath(args.output)
+
+    if args.trace is not None:
+        args.trace = os.path.abspath(args.trace)
+    if args.save_trace is not None:
+        args.save_trace = os.path.abspath(args.save_trace)
+
+    with tempfile.TemporaryDirectory(prefix="theseus-load-") as directory:
+        os.chdir(directory)
+        results = asyncio.run(run(args))
+        os.chdir(ROOT)
+
+    with open(output, "w") as f:
+        json.dump({"slo_ms": args.slo, "level": args.level, "stages": results}, f, indent=2)
+
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import os
+from array import array
+
+import common
+import farm
+import harvesting
+import logger
+import placement
+import store
+import utils
+
+from bench.fakes import make_farm
+from bench.timing import measure
+
+
+DESCRIPTION = "\n".join(f"line {i}: the farm of the month is still the one with the most cows" for i in range(40))
+
+
+def bench_harvest(level: int) -> dict:
+    f = make_farm(level, seed=1)
+    ready = f.farm.planted
+
+    # harvesting replants the squares, put the old times back so every call harvests the whole farm
+    def loop():
+        f.farm.planted = array("I", ready)
+        f.harvest()
+
+    def engine():
+        f.farm.planted = array("I", ready)
+        harvesting.harvest(f)
+
+    return {
+        "Farm.harvest": measure(loop),
+        "harvesting.harvest": measure(engine)
+    }
+
+
+def bench_render(level: int) -> dict:
+    f = make_farm(level, seed=2)
+
+    def cold():
+        f.invalidate()
+        f.render()
+
+    f.render()
+
+    return {
+        "Farm.render (cold)": measure(cold),
+        "Farm.render (cached)": measure(f.render)
+    }
+
+
+def bench_placement(level: int) -> dict:
+    f = make_farm(level, seed=4)
+    width, height = f.get_farm_length_from_level(level)
+
+    # dry runs, a real placement would leave nothing to change for the next call
+    return {
+        "placement.place (fill, dry run)": measure(lambda: placement.place(f, "fill", 0, 0, width - 1, height - 1,
+                                                                           farm.Harvests.CORN, dry_run=True)),
+        "placement.place (border, dry run)": measure(lambda: placement.place(f, "border", 0, 0, width - 1, height - 1,
+                                                                             farm.Harvests.CORN, dry_run=True))
+    }
+
+
+def bench_persistence(level: int, directory: str) -> dict:
+    f = make_farm(level, seed=3)
+    data = f.to_bytes()
+    filename = os.path.join(directory, "farm.json")
+
+    database = store.SqliteFarmStore(os.path.join(directory, "micro.db"), batch_size=1)
+    database.save(1, f)
+
+    results = {
+        "Farm.to_bytes": measure(f.to_bytes),
+        "Farm.from_bytes": measure(lambda: farm.Farm().from_bytes(data)),
+        "Farm.save (json)": measure(lambda: f.save(filename)),
+        "Farm.load (json)": measure(lambda: farm.Farm().load(filename)),
+        "SqliteFarmStore.save": measure(lambda: database.save(1, f)),
+        "SqliteFarmStore.load": measure(lambda: database.load(1))
+    }
+
+    database.close()
+    return results
+
+
+def bench_levels() -> dict:
+    f = farm.Farm()
+    levels = range(1, 1001)
+    fibonacci = range(0, 1500)  # past the end of the level table, those go through fast doubling
+
+    def lengths():
+        for level in levels:
+            f.get_farm_length_from_level(level)
+
+    def fibonaccis():
+        for n in fibonacci:
+            farm.fibonacci_of(n)
+
+    results = {
+        "get_farm_length_from_level (x1000)": measure(lengths),
+        "fibonacci_of (x1500)": measure(fibonaccis)
+    }
+
+    return results
+
+
+def bench_logger(directory: str) -> dict:
+    format = "$color[$info]$reset $timecolor[%H:%M:%S.%f]$reset $message $tracecolor($filename/$funcname:$line)$reset"
+
+    # console off, the file and json writers are the sinks that stay on in production
+    to_file = logger.Logger(False, True, format, filename=os.path.join(directory, "micro.log"),
+                            console_level=3, json_filename=os.path.join(directory, "micro.jsonl"))
+    disabled = logger.Logger(False, False, format, console_level=3)
+
+    results = {
+        "Logger.log (file + json)": measure(lambda: to_file.log("%s issued the following command: %s", "bench", "=harvest",
+                                                                user_id=1, guild=None)),
+        "Logger.log (disabled)": measure(lambda: disabled.log("%s issued the following command: %s", "bench", "=harvest"))
+    }
+
+    to_file.close()
+    disabled.close()
+    return results
+
+
+def bench_text() -> dict:
+    mention = "<@827421329497128981> check the farm of <@843395659487117323>"
+    modified = DESCRIPTION.replace("cows", "potatoes", 5) + "\nand one more line"
+
+    return {
+        "common.get_id": measure(lambda: common.get_id(mention)),
+        "utils.generate_diff": measure(lambda: utils.generate_diff(DESCRIPTION, modified))
+    }
+
+
+def run(level: int, directory: str) -> dict:
+    results = {}
+
+    for name, bench in (("harvest", lambda: bench_harvest(level)),
+                        ("render", lambda: bench_render(level)),
+                        ("placement", lambda: bench_placement(level)),
+                        ("persistence", lambda: bench_persistence(level, directory)),
+                        ("levels", bench_levels),
+                        ("logger", lambda: bench_logger(directory)),
+                        ("text", bench_text)):
+        print(f"micro: {name}", flush=True)
+        results.update(bench())
+
+    return results
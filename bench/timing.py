@@ -0,0 +1,41 @@
+import time
+import timeit
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    # nearest rank, ordered has to be sorted
+    if not ordered:
+        return 0.0
+
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples: list[float], elapsed: float) -> dict:
+    # samples: latencies in ms, elapsed: wall time in s of the whole run
+    ordered = sorted(samples)
+
+    return {
+        "count": len(ordered),
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered), 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 4),
+        "p95_ms": round(percentile(ordered, 95), 4),
+        "p99_ms": round(percentile(ordered, 99), 4),
+        "max_ms": round(ordered[-1], 4) if ordered else 0.0
+    }
+
+
+def measure(func, repeat=7) -> dict:
+    # micro-benchmark: calls per sample are picked by timeit so one sample takes at least 0.2s,
+    # the best sample is the least disturbed one, the median shows the noise
+    timer = timeit.Timer(func, timer=time.perf_counter)
+    number, _ = timer.autorange()
+    per_call = sorted(t / number for t in timer.repeat(repeat, number))
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "ops_per_sec": round(1 / per_call[0], 2),
+        "best_us": round(per_call[0] * 1e6, 4),
+        "median_us": round(per_call[len(per_call) // 2] * 1e6, 4)
+    }
@@ -0,0 +1,127 @@
+import re
+import struct
+
+import farm
+import placement
+
+
+# binary blueprint format: header, then the grid row by row as runs of the same item code
+#   run: item code (1 byte), length (uint16), longer runs are split
+BLUEPRINT_HEADER = struct.Struct("<HH")  # width, height
+BLUEPRINT_RUN = struct.Struct("<BH")
+MAX_RUN = 0xFFFF
+
+NAME = re.compile(r"[A-Za-z0-9_-]{1,32}")  # also a file name in the json store
+
+
+def encode_runs(codes: bytes) -> list[tuple[int, int]]:
+    runs = []
+
+    for code in codes:
+        if runs and runs[-1][0] == code and runs[-1][1] < MAX_RUN:
+            runs[-1][1] += 1
+        else:
+            runs.append([code, 1])
+
+    return [(code, length) for code, length in runs]
+
+
+class Blueprint:
+    # a saved region of a farm, green squares in it are left alone when it is stamped
+
+    __slots__ = ("name", "owner", "width", "height", "codes")
+
+    def __init__(self, name: str, owner: int, width: int, height: int, codes: bytes):
+        self.name = name
+        self.owner = owner  # user id of whoever saved it, the only one that may overwrite or delete it
+        self.width = width
+        self.height = height
+        self.codes = bytes(codes)  # row by row, width * height item codes
+
+    @classmethod
+    def capture(cls, f: farm.Farm, name: str, owner: int, start_x: int, start_y: int, end_x: int, end_y: int):
+        width, height = f.get_farm_length_from_level(f.level)
+        placement.check_bounds(width, height, start_x, start_y, end_x, end_y)
+
+        left, right = min(start_x, end_x), max(start_x, end_x)
+        top, bottom = min(start_y, end_y), max(start_y, end_y)
+        codes = f.farm.codes
+        rows = [codes[y * width + left:y * width + right + 1] for y in range(top, bottom + 1)]
+
+        return cls(name, owner, right - left + 1, bottom - top + 1, b"".join(rows))
+
+    def get_runs(self) -> list[tuple[int, int]]:
+        return encode_runs(self.codes)
+
+    def to_bytes(self) -> bytes:
+        return BLUEPRINT_HEADER.pack(self.width, self.height) + b"".join(BLUEPRINT_RUN.pack(code, length)
+                                                                          for code, length in self.get_runs())
+
+    @classmethod
+    def from_bytes(cls, name: str, owner: int, data: bytes):
+        width, height = BLUEPRINT_HEADER.unpack_from(data)
+        codes = bytearray()
+
+        for code, length in BLUEPRINT_RUN.iter_unpack(data[BLUEPRINT_HEADER.size:]):
+            codes += bytes((code,)) * length
+
+        if len(codes) != width * height:
+            raise ValueError(f"blueprint {name} has {len(codes)} squares instead of {width * height}")
+
+        return cls(name, owner, width, height, codes)
+
+    def to_dict(self) -> dict:
+        # runs by item name, like the json farms
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "width": self.width,
+            "height": self.height,
+            "runs": [[farm.CODES[code].name.lower(), length] for code, length in self.get_runs()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        codes = b"".join(bytes((farm.CODE_OF[farm.Harvests[name.upper()]],)) * length for name, length in data["runs"])
+        return cls(data["name"], data["owner"], data["width"], data["height"], codes)
+
+    def get_squares(self, f: farm.Farm, x: int, y: int) -> dict[farm.Harvests, list[int]]:
+        # Harvests -> indexes of the farm it goes to, with the top left corner of the blueprint at x, y
+        width, height = f.get_farm_length_from_level(f.level)
+        placement.check_bounds(width, height, x, y, x + self.width - 1, y + self.height - 1)
+
+        squares = {}
+
+        for row in range(self.height):
+            start = (y + row) * width + x
+
+            for column, code in enumerate(self.codes[row * self.width:(row + 1) * self.width]):
+                if code != farm.CODE_OF[farm.Harvests.GREEN_SQUARE]:
+                    squares.setdefault(farm.CODES[code], []).append(start + column)
+
+        return squares
+
+    def describe(self) -> str:
+        counts = {}
+
+        for code in self.codes:
+            if code != farm.CODE_OF[farm.Harvests.GREEN_SQUARE]:
+                counts[code] = counts.get(code, 0) + 1
+
+        return f"{self.width}x{self.height}, " + (", ".join(f":{farm.CODES[code].name.lower()}:{amount}" for code, amount in counts.items()) or "empty")
+
+
+def stamp(f: farm.Farm, blueprint: Blueprint, x: int, y: int, dry_run=False) -> list[placement.Plan]:
+    # one placement per crop of the blueprint, paid and applied together or not at all
+    # each crop is planned against the inventory the ones before it leave behind, overwritten squares included
+    harvests = dict(f.harvests)
+    plans = []
+
+    for harvest, indexes in blueprint.get_squares(f, x, y).items():
+        plans.append(placement.plan(f, harvest, indexes, harvests=harvests))
+        placement.settle(harvests, plans[-1])
+
+    if not dry_run:
+        placement.apply(f, *plans)
+
+    return plans
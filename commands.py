@@ -0,0 +1,211 @@
+QUOTES = "\"'"
+
+
+class ArgumentError(Exception):
+    # raised while parsing arguments, the message is sent back to the user as is
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class Token:
+    __slots__ = ("value", "start", "end")
+
+    def __init__(self, value: str, start: int, end: int):
+        self.value = value
+        self.start = start  # position in the command text, including an opening quote
+        self.end = end
+
+
+def tokenize(text: str) -> list[Token]:
+    # splits on whitespace in a single pass, "quoted text" and 'quoted text' stay one token without the quotes
+    # a quote only counts if the same character closes it right before whitespace or the end, so Bob's stays as typed
+    tokens = []
+    i = 0
+    length = len(text)
+
+    while i < length:
+
+        if text[i].isspace():
+            i += 1
+            continue
+
+        start = i
+
+        if text[i] in QUOTES:
+            end = text.find(text[i], i + 1)
+
+            if end != -1 and (end + 1 == length or text[end + 1].isspace()):
+                tokens.append(Token(text[i + 1:end], start, end + 1))
+                i = end + 1
+                continue
+
+        while i < length and not text[i].isspace():
+            i += 1
+
+        tokens.append(Token(text[start:i], start, i))
+
+    return tokens
+
+
+class Argument:
+
+    def __init__(self, name: str, converter=str, optional=False, rest=False, error=None):
+        self.name = name
+        self.converter = converter  # callable(str), raises ValueError or KeyError on bad input
+        self.optional = optional
+        self.rest = rest  # takes the remaining text verbatim, only for the last argument
+        self.error = error  # message if the converter fails, formatted with value and prefix
+
+    def convert(self, value: str, prefix: str):
+        try:
+            return self.converter(value)
+        except (ValueError, KeyError):
+            if self.error is None:
+                raise ArgumentError(f"{value} is not a valid {self.name}! send {prefix}help for help.")
+            raise ArgumentError(self.error.format(value=value, prefix=prefix))
+
+
+class Context:
+    # everything a command handler gets besides the bot itself
+
+    def __init__(self, raw, command, prefix: str, args: dict, text: str | None):
+        self.raw = raw
+        self.command = command
+        self.prefix = prefix
+        self.args = args
+        self.text = text  # everything after the command name, None if there is nothing
+
+    async def reply(self, *args, **kwargs):
+        return await self.raw.reply(*args, **kwargs)
+
+
+class Command:
+
+    def __init__(self, name: str, handler, description="", usage=None, aliases=(), args=(), hidden=False, admin=False):
+        self.name = name
+        self.handler = handler
+        self.description = description
+        self.usage = usage
+        self.aliases = tuple(aliases)
+        self.args = tuple(args)
+        self.hidden = hidden or admin  # left out of the help menu
+        self.admin = admin  # only usable by the bot admins
+
+    def get_usage(self, prefix: str) -> str:
+        if self.usage is not None:
+            return f"{prefix}{self.name} {self.usage}" if self.usage else f"{prefix}{self.name}"
+
+        parts = [prefix + self.name]
+        for arg in self.args:
+            parts.append(f"[{arg.name}: {getattr(arg.converter, '__name__', 'str')}]")
+        return " ".join(parts)
+
+    def parse_args(self, text: str, tokens: list[Token], prefix: str) -> dict:
+        args = {}
+
+        for i, arg in enumerate(self.args):
+
+            if i >= len(tokens):
+                if not arg.optional:
+                    raise ArgumentError(f"Too few arguments! send {prefix}help for help.")
+                args[arg.name] = None
+                continue
+
+            if arg.rest:
+                # exactly as typed, quotes included
+                value = text[tokens[i].start:]
+                args[arg.name] = arg.convert(value, prefix)
+                break
+
+            args[arg.name] = arg.convert(tokens[i].value, prefix)
+
+        return args
+
+
+class CommandRegistry:
+
+    def __init__(self):
+        self.commands: dict[str, Command] = {}  # name and every alias -> command
+        self.ordered: list[Command] = []  # registration order, for the help menu
+        self.version = 0  # bumped whenever a command is added
+
+    def command(self, name: str, description="", usage=None, aliases=(), args=(), hidden=False, admin=False):
+        def decorator(handler):
+            self.add(Command(name, handler, description, usage, aliases, args, hidden, admin))
+            return handler
+        return decorator
+
+    def add(self, command: Command):
+        for key in (command.name,) + command.aliases:
+            if key in self.commands:
+                raise ValueError(f"command {key} is registered twice")
+            self.commands[key] = command
+
+        self.ordered.append(command)
+        self.version += 1
+
+    def get(self, name: str) -> Command | None:
+        return self.commands.get(name)
+
+    def parse(self, raw, prefix: str, text: str) -> Context | None:
+        # text is the message without the prefix, returns None for unknown commands
+        tokens = tokenize(text)
+
+        if not tokens:
+            return None
+
+        command = self.commands.get(tokens[0].value)
+
+        if command is None:
+            return None
+
+        rest = text[tokens[1].start:] if len(tokens) >= 2 else None
+        args = command.parse_args(text, tokens[1:], prefix)
+
+        return Context(raw, command, prefix, args, rest)
+
+    def get_help_fields(self, prefix: str) -> list[dict]:
+        fields = []
+
+        for command in self.ordered:
+
+            if command.hidden:
+                continue
+
+            fields.append({
+                "name": command.get_usage(prefix),
+                "value": command.description,
+                "inline": len(fields) % 2 == 0
+            })
+
+        return fields
+
+
+class ResponseCache:
+    # built responses (embeds, texts) that only change when their key does or on invalidate()
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, build):
+        # build: async callable returning the response, only called on a miss
+        try:
+            response = self.entries[key]
+            self.hits += 1
+            return response
+        except KeyError:
+            pass
+
+        self.misses += 1
+        response = self.entries[key] = await build()
+        return response
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
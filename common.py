@@ -316,6 +316,14 @@ async def create_embed(embed_data):
          埋め込みオブジェクト
     """
 
+    # work on a copy, so callers can keep reusing their embed_data
+    embed_data = dict(embed_data)
+    for key in ("author", "footer"):
+        if isinstance(embed_data.get(key), dict):
+            embed_data[key] = dict(embed_data[key])
+    if "fields" in embed_data:
+        embed_data["fields"] = [dict(field) for field in embed_data["fields"]]
+
     if "title" not in embed_data:
         embed_data["title"] = ""
 
@@ -0,0 +1,62 @@
+import asyncio
+
+
+class Dispatcher:
+    # routes work into one queue + task ("actor") per key, usually the discord user id
+    # items with the same key run strictly in order, different keys run concurrently
+    # actors that stay idle for idle_timeout seconds are reaped and recreated on demand
+
+    def __init__(self, handler, idle_timeout=60.0, on_error=None):
+        self.handler = handler  # async callable taking one item
+        self.idle_timeout = idle_timeout
+        self.on_error = on_error  # callable(item, exception), called inside the except block
+
+        self.actors: dict[int, tuple[asyncio.Queue, asyncio.Task]] = {}
+
+    def dispatch(self, key: int, item):
+        actor = self.actors.get(key)
+
+        if actor is None:
+            queue = asyncio.Queue()
+            task = asyncio.create_task(self.run_actor(key, queue), name=f"actor-{key}")
+            actor = self.actors[key] = (queue, task)
+
+        actor[0].put_nowait(item)
+
+    async def run_actor(self, key: int, queue: asyncio.Queue):
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # nothing can be queued between this check and the return, we never give up the loop here
+                if queue.empty():
+                    del self.actors[key]
+                    return
+                continue
+
+            try:
+                await self.handler(item)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(item, e)
+            finally:
+                queue.task_done()
+
+    def get_active(self) -> int:
+        return len(self.actors)
+
+    async def join(self):
+        # waits until everything queued so far has been handled, actors keep running
+        for queue, _ in list(self.actors.values()):
+            await queue.join()
+
+    async def close(self):
+        # lets every actor finish what is already queued, then stops them
+        await self.join()
+        actors = list(self.actors.values())
+
+        for _, task in actors:
+            task.cancel()
+
+        await asyncio.gather(*(task for _, task in actors), return_exceptions=True)
+        self.actors.clear()
@@ -1,14 +1,14 @@
 import datetime
 import json
 import random
+import struct
+import sys
+from array import array
+from collections import Counter
+from collections.abc import MutableSequence
 from enum import Enum
 
-
-PLACE_MODE = [
-    "/",
-    "\\",
-    "fill"
-]
+from levels import LEVELS
 
 
 class Flag(Enum):
@@ -25,6 +25,8 @@ class Plantable(Enum):
     UNOBTAINABLE = 3
 
 class Harvest:
+    __slots__ = ("name", "product", "rare", "price", "plantable", "days_needed", "flag", "a", "b")
+
     def __init__(self, name: str, plantable: Plantable, price, days_needed=-1, product="undefined", rare="undefined", flag: Flag=Flag.SINGLE, a=1, b=1):
         self.name = name
         self.product = product
@@ -75,33 +77,147 @@ class Harvests(Enum):
     APPLE = Harvest("apple", Plantable.NOT_PLANTABLE, 10)  # TODO: maybe in the future plant an apple and get an apple tree?
     MILK = Harvest("milk", Plantable.NOT_PLANTABLE, 5)
     SWEET_POTATO = Harvest("sweet_potato", Plantable.NOT_PLANTABLE, 0)
+    # new members go at the end, the position of a member is its item code in saved farms
+
+
+CODES = tuple(Harvests)  # item code -> Harvests
+CODE_OF = {harvest: code for code, harvest in enumerate(CODES)}  # Harvests -> item code
+EMOJIS = tuple(':' + harvest.value.name + ':' for harvest in CODES)  # item code -> rendered square
+
+
+class Grid(MutableSequence):
+    # the farm squares as one byte per square, behaves like a list of Harvests
+    # next to it the unix time every square was planted at, as one uint32 per square,
+    # setting a square keeps its time, plant() is what resets it
+
+    __slots__ = ("codes", "planted")
+
+    def __init__(self, squares=(), planted=0):
+        self.codes = bytearray(CODE_OF[square] for square in squares)
+        self.planted = array("I", bytes(4 * len(self.codes))) if not planted else array("I", [planted]) * len(self.codes)
+
+    @classmethod
+    def from_codes(cls, codes, planted=0):
+        # planted: one time for every square, or an array('I') with a time per square
+        grid = cls()
+        grid.codes = bytearray(codes)
+        grid.planted = array("I", planted) if isinstance(planted, array) else array("I", [planted]) * len(grid.codes)
+        return grid
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Grid.from_codes(self.codes[index], self.planted[index])
+        return CODES[self.codes[index]]
+
+    def __setitem__(self, index, harvest):
+        if isinstance(index, slice):
+            codes = bytes(CODE_OF[square] for square in harvest)
+
+            if len(codes) != len(self.codes[index]):  # the grid grows or shrinks, new squares are unplanted
+                self.planted[index] = array("I", bytes(4 * len(codes)))
+
+            self.codes[index] = codes
+        else:
+            self.codes[index] = CODE_OF[harvest]
+
+    def __delitem__(self, index):
+        del self.codes[index]
+        del self.planted[index]
+
+    def __iter__(self):
+        return map(CODES.__getitem__, self.codes)
+
+    def __eq__(self, other):
+        if isinstance(other, Grid):
+            return self.codes == other.codes
+        return list(self) == other
+
+    def __repr__(self):
+        return f"Grid({[square.name for square in self]})"
+
+    def insert(self, index, harvest, planted=0):
+        self.codes.insert(index, CODE_OF[harvest])
+        self.planted.insert(index, planted)
+
+    def append(self, harvest, planted=0):
+        self.codes.append(CODE_OF[harvest])
+        self.planted.append(planted)
+
+    def plant(self, index: int, harvest, planted: int):
+        self.codes[index] = CODE_OF[harvest]
+        self.planted[index] = planted
+
+    def count(self, harvest):
+        return self.codes.count(CODE_OF[harvest])
+
+    def counts(self) -> dict:
+        # Harvests -> amount of squares, in order of first appearance
+        return {CODES[code]: amount for code, amount in Counter(self.codes).items()}
+
+    def get_earliest(self) -> dict:
+        # Harvests -> time the longest growing square of it was planted at, in order of first appearance
+        earliest = {}
+
+        for code, planted in zip(self.codes, self.planted):
+            if planted < earliest.get(code, planted + 1):
+                earliest[code] = planted
+
+        return {CODES[code]: planted for code, planted in earliest.items()}
+
+    def copy(self):
+        return Grid.from_codes(self.codes, self.planted)
+
+
+# binary save format, version 2:
+#   header, then the utf-8 name, then the inventory entries, then one byte per square, then the planted times
+#   inventory entry: name length (1 byte), utf-8 name, amount (int64)
+#   planted times: one little endian uint32 per square, version 1 has none, every square counts as planted at last_harvest
+FORMAT_MAGIC = b"TFRM"
+FORMAT_VERSION = 2
+FORMAT_HEADER = struct.Struct("<4sBIdHHI")  # magic, version, level, last_harvest timestamp, name length, inventory entries, squares
+FORMAT_AMOUNT = struct.Struct("<q")
+
 
 class Farm:
 
+    __slots__ = ("name", "level", "last_harvest", "farm", "harvests", "rows", "rows_size", "rendered")
+
     def __init__(self, name="undefined", level=1, last_harvest: datetime.datetime = datetime.datetime.now()):
         self.name = name
         self.level = level
 
         self.last_harvest = last_harvest
 
-        self.farm = []
+        self.farm = Grid()
         self.harvests = {}
 
+        # render cache, one string per row of the grid, None if the row has to be rendered again
+        self.rows = []
+        self.rows_size = (0, 0)
+        self.rendered = None
+
         self.reset()
 
 
     def harvest(self):
 
         res = {}
+        now = datetime.datetime.now()
+        stamp = int(now.timestamp())
+        planted = self.farm.planted
 
-        for square in self.farm:
+        for i, square in enumerate(self.farm):
 
             harvest = square.value
 
             if harvest.plantable == Plantable.UNOBTAINABLE:
                 continue
 
-            if datetime.datetime.now() - self.last_harvest >= datetime.timedelta(days=harvest.days_needed):
+            # every square grows on its own, a harvested square starts growing again
+            if stamp - planted[i] >= harvest.days_needed * 86400:
 
                 name, value = harvest.get()
 
@@ -110,29 +226,37 @@ class Farm:
 
                 res[name] += value
                 self.add(name, value)
+                planted[i] = stamp
 
-        self.last_harvest = datetime.datetime.now()
+        self.last_harvest = now
 
         return res
 
     def get_all_harvestable_time(self):
 
         dates = {}
+        now = datetime.datetime.now()
 
-        for i, square in enumerate(self.farm):
+        # the square of a crop that has been growing the longest, so each crop is only looked at once
+        for square, planted in self.farm.get_earliest().items():
 
             harvest = square.value
 
             if harvest.plantable == Plantable.UNOBTAINABLE:
                 continue
 
-            res = str(datetime.timedelta(days=harvest.days_needed) - (datetime.datetime.now() - self.last_harvest))
+            res = str(datetime.timedelta(days=harvest.days_needed) - (now - datetime.datetime.fromtimestamp(planted)))
             res = res.replace(",", " and")
 
-            dates[harvest.name.lower()] = res
+            dates[square.name.lower()] = res
 
         return dates
 
+    def get_ready_times(self) -> dict:
+        # crop -> unix timestamp from which its first square can be harvested, what the harvest scheduler keeps track of
+        return {square.name.lower(): planted + square.value.days_needed * 86400
+                for square, planted in self.farm.get_earliest().items() if square.value.plantable != Plantable.UNOBTAINABLE}
+
 
     def decompile_harvest_result(self, result):
 
@@ -172,17 +296,22 @@ class Farm:
 
         return amount
 
+    def get_stats(self) -> dict:
+        # the aggregates the leaderboard ranks farms by
+        return {
+            "level": self.level,
+            "moneybag": self.harvests.get("moneybag", 0),
+            "inventory": self.get_total_harvests(),
+            "tiles": len(self.farm)
+        }
+
     def get_inventory_limit(self) -> int:
-        return (fibonacci_of(self.level + 1)) * 10
+        return LEVELS.get_inventory_limit(self.level)
 
     def get_level_cost(self, level: int):
         if level == 1:
             raise ValueError('you cannot upgrade to level 1??')
-        x, y = self.get_farm_length_from_level(level - 1)
-        if level % 2 == 0:
-            return y
-        else:
-            return x
+        return LEVELS.get_level_cost(level)
 
     def add(self, product, amount):
         for slot in self.harvests:
@@ -194,12 +323,13 @@ class Farm:
 
     def reset(self):
 
-        self.farm = [
+        self.invalidate()
+        self.farm = Grid([
             Harvests.CORN,
             Harvests.POTATO,
             Harvests.COW,
             Harvests.DECIDUOUS_TREE
-        ]
+        ], int(self.last_harvest.timestamp()))
 
         for harvest in list(Harvests):
             if not (harvest.value.plantable == Plantable.PLANTABLE or harvest.value.plantable == Plantable.UNOBTAINABLE):
@@ -217,38 +347,110 @@ class Farm:
 
         return res
 
-    def save(self, filename):
-        with open(filename, "w") as f:
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "level": self.level,
+            "last_harvest": self.last_harvest.strftime("%Y-%m-%d %H:%M:%S"),
+            "harvests": self.harvests,
+            "farm": self.get_farm_to_str_list(),
+            "planted": self.farm.planted.tolist()
+        }
 
-            data = {
-                "name": self.name,
-                "level": self.level,
-                "last_harvest": self.last_harvest.strftime("%Y-%m-%d %H:%M:%S"),
-                "harvests": self.harvests,
-                "farm": self.get_farm_to_str_list()
-            }
+    def copy(self):
+        f = Farm(self.name, self.level, self.last_harvest)
+        f.farm = self.farm.copy()
+        f.harvests = dict(self.harvests)
+        return f
 
-            f.write(json.dumps(data))
+    def from_dict(self, farm_data: dict):
+        try:
+            self.name = farm_data["name"]
+            self.level = farm_data["level"]
+            self.last_harvest = datetime.datetime.strptime(farm_data["last_harvest"], "%Y-%m-%d %H:%M:%S")
+            self.harvests = farm_data["harvests"]
 
-    def load(self, filename):
-        with open(filename, "r+") as f:
-            try:
-                farm_data: dict = json.load(f)
+            self.farm = Grid((Harvests.__getitem__(harvest.upper()) for harvest in farm_data["farm"]), int(self.last_harvest.timestamp()))
+
+            if len(farm_data.get("planted", ())) == len(self.farm):  # older files don't have them
+                self.farm.planted = array("I", farm_data["planted"])
+
+            self.invalidate()
+
+        except KeyError:
+            print("Broken farm detected!")
+            # f.truncate()
+            # self.save()
+
+    def to_bytes(self) -> bytes:
+        name = self.name.encode("utf-8")
+        parts = [FORMAT_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, self.level, self.last_harvest.timestamp(),
+                                    len(name), len(self.harvests), len(self.farm)), name]
+
+        for item, amount in self.harvests.items():
+            item = item.encode("utf-8")
+            parts.append(bytes((len(item),)))
+            parts.append(item)
+            parts.append(FORMAT_AMOUNT.pack(amount))
+
+        parts.append(self.farm.codes)
+
+        planted = self.farm.planted
+
+        if sys.byteorder != "little":
+            planted = array("I", planted)
+            planted.byteswap()
+
+        parts.append(planted.tobytes())
+
+        return b"".join(parts)
+
+    def from_bytes(self, data: bytes):
+        magic, version, level, last_harvest, name_length, entries, squares = FORMAT_HEADER.unpack_from(data)
+
+        if magic != FORMAT_MAGIC:
+            raise ValueError("not a binary farm")
+
+        if version not in (1, FORMAT_VERSION):
+            raise ValueError(f"unsupported farm format version {version}")
+
+        offset = FORMAT_HEADER.size
+        self.name = data[offset:offset + name_length].decode("utf-8")
+        offset += name_length
+
+        self.harvests = {}
+        for _ in range(entries):
+            length = data[offset]
+            item = data[offset + 1:offset + 1 + length].decode("utf-8")
+            offset += 1 + length
+            self.harvests[item] = FORMAT_AMOUNT.unpack_from(data, offset)[0]
+            offset += FORMAT_AMOUNT.size
+
+        self.level = level
+        self.last_harvest = datetime.datetime.fromtimestamp(last_harvest)
+        codes = data[offset:offset + squares]
+        offset += squares
+
+        if version == 1:
+            self.farm = Grid.from_codes(codes, int(last_harvest))
+        else:
+            planted = array("I", data[offset:offset + 4 * squares])
 
-                try:
-                    self.name = farm_data["name"]
-                    self.level = farm_data["level"]
-                    self.last_harvest = datetime.datetime.strptime(farm_data["last_harvest"], "%Y-%m-%d %H:%M:%S")
-                    self.harvests = farm_data["harvests"]
+            if sys.byteorder != "little":
+                planted.byteswap()
 
-                    self.farm = []
-                    for harvest in farm_data["farm"]:
-                        self.farm.append(Harvests.__getitem__(harvest.upper()))
+            self.farm = Grid.from_codes(codes, planted)
 
-                except KeyError:
-                    print("Broken farm detected!")
-                    # f.truncate()
-                    # self.save()
+        self.invalidate()
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            f.write(json.dumps(self.to_dict()))
+
+    def load(self, filename):
+        with open(filename, "r+") as f:
+            try:
+                self.from_dict(json.load(f))
 
             except json.decoder.JSONDecodeError as jde:
                 print(f'{filename} JSONDecodeError')
@@ -258,15 +460,7 @@ class Farm:
                 print("'" + str(f.read()) + "'")
 
     def get_farm_length_from_level(self, level: int) -> (int, int):
-
-        x = 2
-        y = 2
-        for i in range(1, level):
-            if i % 2 == 0:
-                y += 1
-            else:
-                x += 1
-        return x, y
+        return LEVELS.get_dimensions(level)
 
     def set_index(self, index: int, harvest: Harvests) -> bool: # returns True if successful
 
@@ -298,30 +492,49 @@ class Farm:
                 self.harvests[square.name.lower()] = 0
             self.harvests[square.name.lower()] += 1
 
-        self.farm[index] = harvest
+        self.farm.plant(index, harvest, int(datetime.datetime.now().timestamp()))
+        self.invalidate(index)
 
         return True
 
     def set_indext(self, index: int, harvest: Harvests) -> bool: # returns True if successful
-        self.farm[index] = harvest
+        self.farm.plant(index, harvest, int(datetime.datetime.now().timestamp()))
+        self.invalidate(index)
 
         return True
 
+    def invalidate(self, index: int = None):
+        # drops the cached row of the square at index, or every row if no index is given
+        self.rendered = None
+
+        if index is None:
+            self.rows_size = (0, 0)
+        elif self.rows_size[0]:
+            row = index // self.rows_size[0]
+            if row < len(self.rows):
+                self.rows[row] = None
 
     def render(self) -> str:
-        out = ''
-        for y in range(self.get_farm_length_from_level(self.level)[1]):
-            for x in range(self.get_farm_length_from_level(self.level)[0]):
-                i = y * self.get_farm_length_from_level(self.level)[0] + x
-                out += ':' + self.farm[i].value.name + ':'
-            out += '\n'
-        return out
+        width, height = self.get_farm_length_from_level(self.level)
 
-def fibonacci_of(n):
-    if n in {0, 1}:
-        return n
+        if self.rows_size != (width, height):  # new farm or an upgrade, the layout changed
+            self.rows = [None] * height
+            self.rows_size = (width, height)
+            self.rendered = None
+
+        if self.rendered is not None:
+            return self.rendered
+
+        codes = self.farm.codes
+        for y in range(height):
+            if self.rows[y] is None:
+                self.rows[y] = ''.join([EMOJIS[code] for code in codes[y * width:(y + 1) * width]])
 
-    return fibonacci_of(n - 1) + fibonacci_of(n - 2)  # Recursive case
+        self.rendered = '\n'.join(self.rows) + '\n'
+        return self.rendered
+
+def fibonacci_of(n):
+    return LEVELS.get_fibonacci(n)
 
 
 if __name__ == '__main__':
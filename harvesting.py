@@ -0,0 +1,246 @@
+import datetime
+import math
+import random
+import timeit
+
+import farm
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, without it small farms go through Farm.harvest and big draws are approximated
+    numpy = None
+
+
+VECTORIZE_THRESHOLD = 32  # below this many tiles the plain loop is just as fast
+EXACT_LIMIT = 1000  # without numpy, draws bigger than this use the normal approximation instead of one random number each
+
+# cumulative growth: a crop left alone for several of its cycles yields once per completed cycle,
+# instead of once no matter how long it was left
+CUMULATIVE = False
+
+rng = numpy.random.default_rng() if numpy is not None else None
+
+if numpy is not None:
+    # item code -> seconds a square needs to grow / whether it never yields anything
+    PERIODS = numpy.array([square.value.days_needed * 86400 for square in farm.CODES], dtype=numpy.int64)
+    BARREN = numpy.array([square.value.plantable == farm.Plantable.UNOBTAINABLE for square in farm.CODES])
+
+
+def binomial(n: int, p: float) -> int:
+    if rng is not None:
+        return int(rng.binomial(n, p))
+
+    if n <= EXACT_LIMIT:
+        return sum(random.random() < p for _ in range(n))
+
+    return min(n, max(0, round(random.gauss(n * p, math.sqrt(n * p * (1 - p))))))
+
+
+def uniform_sum(n: int, a: int, b: int) -> int:
+    # sum of n randint(a, b)
+    if rng is not None:
+        # how often each value comes up, so the cost depends on the range and not on n
+        return int(rng.multinomial(n, [1 / (b - a + 1)] * (b - a + 1)) @ numpy.arange(a, b + 1))
+
+    if n <= EXACT_LIMIT:
+        return sum(random.randint(a, b) for _ in range(n))
+
+    variance = ((b - a + 1) ** 2 - 1) / 12
+    return min(n * b, max(n * a, round(random.gauss(n * (a + b) / 2, math.sqrt(n * variance)))))
+
+
+def draw(harvest: farm.Harvest, amount: int) -> list[tuple[str, int]]:
+    # yields of `amount` tiles (or tile cycles) of the same crop in one go, same distribution as calling Harvest.get() for each
+
+    if harvest.flag == farm.Flag.SINGLE:
+        return [(harvest.product, amount)]
+
+    if harvest.flag == farm.Flag.RANDOM_RANGE:
+        return [(harvest.product, uniform_sum(amount, harvest.a, harvest.b))]
+
+    chance = 1 / (harvest.b - harvest.a + 1)  # randint(a, b) == a
+
+    if harvest.flag == farm.Flag.PERCENTAGE:
+        return [(harvest.product, binomial(amount, chance))]
+
+    if harvest.flag == farm.Flag.RANDOM_DIFFERENT_ITEM_DROP:
+        rare = binomial(amount, chance)
+        return [(name, value) for name, value in ((harvest.product, amount - rare), (harvest.rare, rare)) if value > 0]
+
+    return []
+
+
+def grow(grid: farm.Grid, now: int, cumulative: bool) -> dict:
+    # Harvests -> completed growth cycles of all its squares together, every square grows from its own planted time
+    # harvested squares start over at now, with cumulative growth at the end of their last cycle, so no time is lost
+    # vectorized over all squares at once with numpy, a single pass over the squares without
+
+    cycles = {}
+
+    if numpy is not None:
+        codes = numpy.frombuffer(grid.codes, dtype=numpy.uint8)
+        planted = numpy.frombuffer(grid.planted, dtype=numpy.uint32)  # a view, writing to it moves the squares
+
+        periods = PERIODS[codes]
+        times = planted.astype(numpy.int64)
+        done = numpy.where(periods > 0, (now - times) // numpy.maximum(periods, 1), 1)  # no growth time: always ready
+        done[BARREN[codes]] = 0
+        done = numpy.clip(done, 0, None if cumulative else 1)
+
+        if cumulative:
+            planted[:] = numpy.where((done > 0) & (periods > 0), times + done * periods, numpy.where(done > 0, now, times))
+        else:
+            planted[:] = numpy.where(done > 0, now, times)
+
+        totals = numpy.bincount(codes, weights=done, minlength=len(farm.CODES))
+
+        for code in numpy.flatnonzero(totals):
+            cycles[farm.CODES[code]] = int(totals[code])
+
+        return cycles
+
+    planted = grid.planted
+
+    for i, code in enumerate(grid.codes):
+        square = farm.CODES[code]
+
+        if square.value.plantable == farm.Plantable.UNOBTAINABLE:
+            continue
+
+        period = square.value.days_needed * 86400
+        done = 1 if period <= 0 else (now - planted[i]) // period
+
+        if not cumulative:
+            done = min(done, 1)
+
+        if done <= 0:
+            continue
+
+        cycles[square] = cycles.get(square, 0) + done
+        planted[i] = planted[i] + done * period if cumulative and period > 0 else now
+
+    return cycles
+
+
+def harvest_batched(f: farm.Farm, cumulative=False) -> dict:
+    # same as Farm.harvest, but every crop is drawn once for all of its ready squares,
+    # with cumulative growth every completed cycle counts, still one draw per crop however long it has been
+
+    now = datetime.datetime.now()
+    res = {}
+
+    for square, cycles in grow(f.farm, int(now.timestamp()), cumulative).items():
+
+        if cycles <= 0:
+            continue
+
+        for name, value in draw(square.value, cycles):
+
+            if res.get(name) is None:
+                res[name] = 0
+
+            res[name] += value
+            f.add(name, value)
+
+    f.last_harvest = now
+
+    return res
+
+
+def harvest(f: farm.Farm, cumulative=None) -> dict:
+    cumulative = CUMULATIVE if cumulative is None else cumulative
+
+    if cumulative:
+        return harvest_batched(f, cumulative=True)
+
+    if numpy is None or len(f.farm) < VECTORIZE_THRESHOLD:
+        return f.harvest()
+
+    return harvest_batched(f)
+
+
+if __name__ == '__main__':
+    # benchmark: python harvesting.py
+
+    if numpy is None:
+        raise SystemExit("numpy is not installed, there is nothing to compare against")
+
+    plantable = [h for h in farm.Harvests if h.value.plantable in (farm.Plantable.PLANTABLE, farm.Plantable.CONSUMABLE_PLANTABLE)]
+
+    def make_farm(level: int) -> farm.Farm:
+        f = farm.Farm("bench", level, datetime.datetime.now() - datetime.timedelta(days=3))
+        x, y = f.get_farm_length_from_level(level)
+        f.farm = farm.Grid((random.choice(plantable) for _ in range(x * y)), int(f.last_harvest.timestamp()))
+        f.harvests = {h.value.product: 0 for h in farm.Harvests}
+        f.harvests.update({h.value.rare: 0 for h in farm.Harvests})
+        return f
+
+    def run(engine, template: farm.Farm) -> dict:
+        f = template.copy()
+        return engine(f)
+
+    for level in (1, 10, 40, 100):
+        template = make_farm(level)
+        runs = 200
+
+        loop = timeit.timeit(lambda: run(farm.Farm.harvest, template), number=runs) / runs
+        batched = timeit.timeit(lambda: run(harvest_batched, template), number=runs) / runs
+
+        print(f"level {level:>3} ({len(template.farm):>4} tiles): "
+              f"loop {loop * 1e6:9.1f}us, batched {batched * 1e6:9.1f}us, {loop / batched:5.1f}x")
+
+    # both engines have to agree on the yield distribution
+    template = make_farm(40)
+    samples = 2000
+
+    for engine in (farm.Farm.harvest, harvest_batched):
+        results = [run(engine, template) for _ in range(samples)]
+        names = sorted({name for result in results for name in result})
+
+        print(engine.__qualname__)
+        for name in names:
+            values = [result.get(name, 0) for result in results]
+            print(f"  {name:>14}: mean {numpy.mean(values):8.2f}, std {numpy.std(values):6.2f}")
+
+    # catch-up after weeks away: one draw per crop against harvesting every cycle of every tile
+    def catch_up_loop(f: farm.Farm) -> dict:
+        now = int(datetime.datetime.now().timestamp())
+        res = {}
+
+        for square, planted in zip(f.farm, f.farm.planted):
+            if square.value.plantable == farm.Plantable.UNOBTAINABLE:
+                continue
+
+            period = square.value.days_needed * 86400
+
+            for _ in range(1 if period <= 0 else (now - planted) // period):
+                name, value = square.value.get()
+                res[name] = res.get(name, 0) + value
+
+        return res
+
+    template = make_farm(40)
+    template.farm.planted = farm.array("I", (planted - 60 * 86400 for planted in template.farm.planted))
+    runs = 20
+
+    loop = timeit.timeit(lambda: run(catch_up_loop, template), number=runs) / runs
+    cumulative = timeit.timeit(lambda: run(lambda f: harvest_batched(f, cumulative=True), template), number=runs) / runs
+    print(f"63 days at level 40: per cycle {loop * 1e6:9.1f}us, cumulative {cumulative * 1e6:9.1f}us, {loop / cumulative:5.1f}x")
+
+    samples = 200
+    numpy_module, numpy_rng = numpy, rng
+
+    for label, engine in (("per cycle", catch_up_loop),
+                          ("cumulative", lambda f: harvest_batched(f, cumulative=True)),
+                          ("cumulative without numpy", lambda f: harvest_batched(f, cumulative=True))):
+        numpy, rng = (None, None) if label.endswith("without numpy") else (numpy_module, numpy_rng)
+        results = [run(engine, template) for _ in range(samples)]
+        numpy = numpy_module
+        names = sorted({name for result in results for name in result})
+
+        print(label)
+        for name in names:
+            values = [result.get(name, 0) for result in results]
+            print(f"  {name:>14}: mean {numpy.mean(values):10.1f}, std {numpy.std(values):8.2f}")
+
+    numpy, rng = numpy_module, numpy_rng
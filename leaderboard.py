@@ -0,0 +1,75 @@
+from bisect import bisect_left, insort
+
+import farm
+
+
+METRICS = ("level", "moneybag", "inventory", "tiles")
+
+ALIASES = {
+    "money": "moneybag",
+    "moneybag": "moneybag",
+    "level": "level",
+    "inventory": "inventory",
+    "items": "inventory",
+    "tiles": "tiles",
+    "size": "tiles"
+}
+
+
+class Leaderboard:
+    # per farm aggregates plus one sorted index per metric, updated on every save
+    # the indexes hold (-value, user_id) so the best farms come first and ties are stable
+
+    def __init__(self):
+        self.entries: dict[int, dict] = {}
+        self.indexes: dict[str, list[tuple[int, int]]] = {metric: [] for metric in METRICS}
+
+    @classmethod
+    def from_store(cls, store):
+        # store: anything with iter_stats(), the sqlite store keeps them in their own table
+        leaderboard = cls()
+
+        for user_id, stats in store.iter_stats():
+            leaderboard.entries[user_id] = stats
+
+        for metric, index in leaderboard.indexes.items():
+            index.extend((-stats[metric], user_id) for user_id, stats in leaderboard.entries.items())
+            index.sort()
+
+        return leaderboard
+
+    def update(self, user_id: int, stats: dict):
+        old = self.entries.get(user_id)
+
+        if old == stats:
+            return
+
+        for metric, index in self.indexes.items():
+
+            if old is not None:
+                if old[metric] == stats[metric]:
+                    continue
+
+                i = bisect_left(index, (-old[metric], user_id))
+                del index[i]
+
+            insort(index, (-stats[metric], user_id))
+
+        self.entries[user_id] = stats
+
+    def update_farm(self, user_id: int, f: farm.Farm):
+        self.update(user_id, f.get_stats())
+
+    def top(self, metric: str, k=10) -> list[tuple[int, int]]:
+        return [(user_id, -value) for value, user_id in self.indexes[metric][:k]]
+
+    def get_rank(self, metric: str, user_id: int) -> int | None:
+        stats = self.entries.get(user_id)
+
+        if stats is None:
+            return None
+
+        return bisect_left(self.indexes[metric], (-stats[metric], user_id)) + 1
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,71 @@
+class LevelTable:
+    # farm dimensions, upgrade costs and inventory limits per level
+    # levels up to max_level are filled in lazily in chunks and then looked up in O(1),
+    # anything above is computed directly (no recursion, no loop over the levels)
+
+    def __init__(self, max_level=1000, chunk=256):
+        self.max_level = max_level
+        self.chunk = chunk
+
+        # index = level, index 0 is unused
+        self.widths = [0]
+        self.heights = [0]
+        self.inventory_limits = [0]
+        self.fibonacci_numbers = [0, 1]
+
+    def extend(self, level: int):
+        target = min(self.max_level, (level // self.chunk + 1) * self.chunk)
+
+        while len(self.fibonacci_numbers) <= target + 1:
+            self.fibonacci_numbers.append(self.fibonacci_numbers[-1] + self.fibonacci_numbers[-2])
+
+        for i in range(len(self.widths), target + 1):
+            x, y = self.compute_dimensions(i)
+            self.widths.append(x)
+            self.heights.append(y)
+            self.inventory_limits.append(self.fibonacci_numbers[i + 1] * 10)
+
+    def compute_dimensions(self, level: int) -> (int, int):
+        # every odd step up to the level widens the farm, every even one makes it taller
+        return 2 + level // 2, 2 + (level - 1) // 2
+
+    def get_dimensions(self, level: int) -> (int, int):
+        if level < 1:
+            return 2, 2
+
+        if level > self.max_level:
+            return self.compute_dimensions(level)
+
+        if level >= len(self.widths):
+            self.extend(level)
+
+        return self.widths[level], self.heights[level]
+
+    def get_level_cost(self, level: int) -> int:
+        x, y = self.get_dimensions(level - 1)
+        return y if level % 2 == 0 else x
+
+    def get_inventory_limit(self, level: int) -> int:
+        if 1 <= level <= self.max_level:
+
+            if level >= len(self.inventory_limits):
+                self.extend(level)
+
+            return self.inventory_limits[level]
+
+        return self.get_fibonacci(level + 1) * 10
+
+    def get_fibonacci(self, n: int) -> int:
+        if n < len(self.fibonacci_numbers):
+            return self.fibonacci_numbers[n]
+
+        # fast doubling, O(log n) big int multiplications
+        a, b = 0, 1
+        for bit in bin(n)[2:]:
+            c = a * (2 * b - a)
+            d = a * a + b * b
+            a, b = (d, c + d) if bit == "1" else (c, d)
+        return a
+
+
+LEVELS = LevelTable()
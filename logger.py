@@ -1,13 +1,179 @@
-from datetime import datetime
+from datetime import datetime, date
 
+import atexit
 import os
 import io
+import json
+import queue
+import sys
+import threading
+import time
 import traceback
 import re
 
+
+class LogWriter:
+    # appends lines to a log file from a background thread through one buffered handle
+    # rotates to filename.1 ... filename.<backups> when the file gets too big or the day changes
+
+    ROTATE = object()  # queue marker, rotate now
+    STOP = object()  # queue marker, flush and exit
+
+    def __init__(self, filename: str, max_bytes=10 * 1024 * 1024, rotate_daily=True, backups=7, flush_bytes=64 * 1024, flush_interval=1.0,
+                 serialize=None):
+        self.filename = filename
+        self.serialize = serialize  # turns queued items into lines on the writer thread, None if they already are strings
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.backups = backups  # how many rotated files are kept
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.size = 0
+        self.day = None
+
+        self.thread = threading.Thread(target=self.run, name=f"log-writer-{os.path.basename(filename)}", daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
+    def write(self, content: str):
+        self.queue.put(content)
+
+    def rotate(self):
+        self.queue.put(self.ROTATE)
+
+    def open(self):
+        self.file = open(self.filename, 'a', encoding="UTF-8")
+        self.size = self.file.tell()
+        self.day = date.fromtimestamp(os.path.getmtime(self.filename)) if self.size else date.today()
+
+    def do_rotate(self):
+        self.file.close()
+
+        if self.size:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.filename}.{i}"):
+                    os.replace(f"{self.filename}.{i}", f"{self.filename}.{i + 1}")
+
+            if self.backups > 0:
+                os.replace(self.filename, f"{self.filename}.1")
+            else:
+                os.remove(self.filename)
+
+        self.open()
+
+    def flush(self, buffer: list[str]):
+        if not buffer:
+            return
+
+        data = ''.join(buffer)
+        buffer.clear()
+
+        if (self.size and self.size + len(data) > self.max_bytes) or (self.rotate_daily and self.day != date.today()):
+            self.do_rotate()
+
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def run(self):
+        self.open()
+
+        buffer = []
+        buffered = 0
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is self.STOP:
+                break
+
+            if item is self.ROTATE:
+                self.flush(buffer)
+                self.do_rotate()
+            elif item is not None:
+                if self.serialize is not None:
+                    item = self.serialize(item)
+                buffer.append(item)
+                buffered += len(item)
+
+            if buffered >= self.flush_bytes or time.monotonic() - last_flush >= self.flush_interval:
+                self.flush(buffer)
+                buffered = 0
+                last_flush = time.monotonic()
+
+        self.flush(buffer)
+        self.file.close()
+
+    def close(self):
+        # drains everything written so far, safe to call more than once
+        if self.thread.is_alive():
+            self.queue.put(self.STOP)
+            self.thread.join()
+
+
+class Template:
+    # a log format compiled once into a str.format template
+    # colors and the level name are baked in, only the time, caller and message are filled per record
+
+    FIELDS = re.compile(r"\$(timecolor|tracecolor|color|reset|info|filename|funcname|line|message)")
+
+    def __init__(self, format: str, colors: bool, type: int, color_mappings: list[str], info: str):
+        constants = {
+            "info": info,
+            "reset": "\033[0m" if colors else "",
+            "color": color_mappings[type + 2] if colors else "",  # +2 because indexes 0, 1 are used for other colors
+            "timecolor": color_mappings[0] if colors else "",
+            "tracecolor": color_mappings[1] if colors else ""
+        }
+
+        self.times = []  # (key, literal text with strftime directives)
+        pieces = ["\033[0m"] if colors else []  # reset all colors, if needed
+        position = 0
+
+        for m in self.FIELDS.finditer(format):
+            pieces.append(self.compile_literal(format[position:m.start()]))
+            name = m.group(1)
+            pieces.append(self.escape(constants[name]) if name in constants else "{" + name + "}")
+            position = m.end()
+
+        pieces.append(self.compile_literal(format[position:]))
+
+        self.template = "".join(pieces)
+
+    def escape(self, text: str) -> str:
+        return text.replace("{", "{{").replace("}", "}}")
+
+    def compile_literal(self, text: str) -> str:
+        if "%" not in text:
+            return self.escape(text)
+
+        key = f"t{len(self.times)}"
+        self.times.append((key, text))
+        return "{" + key + "}"
+
+    def render(self, now: datetime, message: str, caller: tuple[str, str, str]) -> str:
+        filename, funcname, line = caller
+        return self.template.format(filename=filename, funcname=funcname, line=line, message=message,
+                                    **{key: now.strftime(text) for key, text in self.times})
+
+
+def serialize_record(record: dict) -> str:
+    # one compact json object per line (ndjson), for log shippers
+    return json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+
 class Logger:
 
-    def __init__(self, colored: bool, write_to_file: bool, format: str, color_mappings=None, filename="latest.log"):
+    def __init__(self, colored: bool, write_to_file: bool, format: str, color_mappings=None, filename="latest.log", trace=True,
+                 max_bytes=10 * 1024 * 1024, backups=7, console_level=0, file_level=0, json_filename=None, json_level=0):
         if color_mappings is None:
             color_mappings = [
                 "\033[34m", # 0, timestamp
@@ -21,78 +187,151 @@ class Logger:
         self.format = format
         self.color_mappings = color_mappings
         self.filename = filename
+        self.trace_enabled = trace  # resolve $filename/$funcname/$line, costs a frame lookup per record
+        self.writer = LogWriter(filename, max_bytes=max_bytes, backups=backups) if write_to_file else None
+
+        # minimum type (0 info, 1 warn, 2 error) a record needs to reach the console / the file
+        self.console_level = console_level
+        self.file_level = file_level
+        self.json_level = json_level
 
-    def log(self, message):
-        print(self.parse(self.format, message, self.colored, 0))
+        # structured sink, one json object per record, serialized on its writer thread
+        self.json_writer = LogWriter(json_filename, max_bytes=max_bytes, backups=backups, serialize=serialize_record) if json_filename else None
 
-        if self.write_to_file:
-            self.write(self.parse(self.format, message, False, 0))
+        self.templates = {}  # (format, colors, type) -> Template
 
-    def warn(self, message):
-        print(self.parse(self.format, message, self.colored, 1))
+    # messages can be lazy: a callable returning the text, or a %-style format with args,
+    # either is only turned into a string if the record is actually written somewhere
 
-        if self.write_to_file:
-            self.write(self.parse(self.format, message, False, 1))
+    # keyword fields (user_id, guild, command, duration, ...) only show up in the json sink
 
-    def error(self, message):
-        print(self.parse(self.format, message, self.colored, 2))
+    def log(self, message, *args, **fields):
+        self.emit(0, message, args, fields)
 
-        if self.write_to_file:
-            self.write(self.parse(self.format, message, False, 2))
+    def warn(self, message, *args, **fields):
+        self.emit(1, message, args, fields)
+
+    def error(self, message, *args, **fields):
+        self.emit(2, message, args, fields)
+
+    def event(self, message, **fields):
+        # a record for the json sink only, e.g. per command timings that would flood the console
+        if self.json_writer is None or self.json_level > 0:
+            return
+
+        self.write_json(0, datetime.now(), str(message), self.trace(1), fields)
+
+    def emit(self, type: int, message, args: tuple, fields: dict):
+        console = type >= self.console_level
+        to_file = self.write_to_file and type >= self.file_level
+        to_json = self.json_writer is not None and type >= self.json_level
+
+        if not console and not to_file and not to_json:
+            return
+
+        message = self.resolve(message, args)
+        caller = self.trace(2)
+        now = datetime.now()
+
+        if console:
+            print(self.get_template(self.format, self.colored, type).render(now, message, caller))
+
+        if to_file:
+            self.write(self.get_template(self.format, False, type).render(now, message, caller))
+
+        if to_json:
+            self.write_json(type, now, message, caller, fields)
+
+    def write_json(self, type: int, now: datetime, message: str, caller: tuple[str, str, str], fields: dict):
+        record = {
+            "timestamp": now.isoformat(),
+            "level": self.info_from_type(type),
+            "caller": f"{caller[0]}/{caller[1]}:{caller[2]}",
+            "message": message
+        }
+        record.update(fields)
+
+        self.json_writer.write(record)
+
+    def resolve(self, message, args: tuple) -> str:
+        if callable(message):
+            message = message()
+
+        if args:
+            return str(message) % args
+
+        return str(message)
 
     def write(self, content):
-        with open(self.filename, 'a', encoding="UTF-8") as f:
-            f.write(content + "\n")
-            f.close()
+        self.writer.write(content + "\n")
 
     def reset_log(self):
+        # starts a fresh log file, the previous one is kept as a rotated backup
+
+        if self.json_writer is not None:
+            self.json_writer.rotate()
 
         if not self.write_to_file:
             return
 
-        if self.filename not in os.listdir('.'):
-            with open(self.filename, 'w', encoding="UTF-8") as f:
-                f.close()
-                return
+        self.writer.rotate()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+        if self.json_writer is not None:
+            self.json_writer.close()
+
+    def get_template(self, format: str, colors: bool, type: int) -> Template:
+        key = (format, colors, type)
+        template = self.templates.get(key)
+
+        if template is None:
+            if type > 2:
+                raise ValueError(f"Unknown type: {type}")
+
+            template = self.templates[key] = Template(format, colors, type, self.color_mappings, self.info_from_type(type))
 
-        with open(self.filename, 'w', encoding="UTF-8") as f:
-            f.truncate()
-            f.close()
+        return template
 
-    def parse(self, format: str, message: str, colors: bool, type: int):
+    def parse(self, format: str, message: str, colors: bool, type: int, caller: tuple[str, str, str] = None):
+        caller = caller if caller is not None else self.trace(1)
+        return self.get_template(format, colors, type).render(datetime.now(), message, caller)
 
-        if type > 2:
-            raise ValueError(f"Unknown type: {type}")
+    def trace(self, depth: int) -> tuple[str, str, str]:
+        # filename, function and line of the frame `depth` levels above the caller of trace
+        # walks the frames directly instead of formatting and parsing the whole stack
 
-        res = ""
+        if not self.trace_enabled:
+            return "", "", ""
 
-        if colors:
-            res += "\033[0m" # reset all colors, if needed
+        try:
+            frame = sys._getframe(depth + 1)
+        except ValueError:  # stack is not that deep
+            return "?", "?", "?"
 
-        res += datetime.now().strftime(format)
-        res = res.replace("$info", self.info_from_type(type)) # string based on type, e.g. WARN, ERROR...
+        return os.path.basename(frame.f_code.co_filename), frame.f_code.co_name, str(frame.f_lineno)
 
-        if colors:
-            res = res.replace("$reset", "\033[0m")  # reset color
-            res = res.replace("$color", self.color_mappings[type + 2]) # color based on type, e.g. "\033[33m" (represents yellow), here its +2 because indexes 0, 1 is used for other color
-            res = res.replace("$timecolor", self.color_mappings[0])
-            res = res.replace("$tracecolor", self.color_mappings[1])
+    def info_from_type(self, type: int):
+        if type == 0:
+            return "INFO"
+        elif type == 1:
+            return "WARN"
+        elif type == 2:
+            return "ERROR"
         else:
-            res = res.replace("$color", "")
-            res = res.replace("$reset", "")
-            res = res.replace("$timecolor", "")
-            res = res.replace("$tracecolor", "")
+            return "INVALID"
 
-        filename, func, line = self.trace()
-        res = res.replace("$filename", filename) # filename of function
-        res = res.replace("$funcname", func) # name of function
-        res = res.replace("$line", line) # line of function
-        res = res.replace("$message", message) # message
 
-        return res
+if __name__ == '__main__':
+    # micro-benchmark: python logger.py
 
-    def trace(self) -> tuple[str, str, str]:
+    import contextlib
+    import timeit
 
+    def trace_from_stack() -> tuple[str, str, str]:
+        # the previous implementation, formats the whole stack and parses it with a regex
         _filename = []
         _func = []
         _line = []
@@ -100,29 +339,37 @@ class Logger:
         trace = io.StringIO()
         traceback.print_stack(file=trace)
         trace_string = trace.getvalue()
-        # print(trace_string)
         trace.close()
 
-        split = trace_string.split('\n')
-        for line in split[:-1:2]:
-            # print(line)
+        for line in trace_string.split('\n'):
             m = re.search('\\s{2}File "(.+?)", line ([0-9]+), in (.+)$', line)
-            # print(m)
-            assert m is not None, str(m)
-
+            if m is None:  # source and caret lines
+                continue
             _filename.append(os.path.basename(m.group(1)))
             _line.append(m.group(2))
             _func.append(m.group(3))
 
-        # return _filename, _func, _line
-        return _filename[-4], _func[-4], _line[-4]
+        return _filename[-5], _func[-5], _line[-5]
 
-    def info_from_type(self, type: int):
-        if type == 0:
-            return "INFO"
-        elif type == 1:
-            return "WARN"
-        elif type == 2:
-            return "ERROR"
-        else:
-            return "INVALID"
\ No newline at end of file
+    class StackLogger(Logger):
+        def trace(self, depth: int) -> tuple[str, str, str]:
+            return trace_from_stack()
+
+    fmt = "$color[$info]$reset $timecolor[%H:%M:%S.%f]$reset $message $tracecolor($filename/$funcname:$line)$reset"
+    runs = 20000
+
+    def nested(depth, func):
+        # a call stack of realistic depth, the bot logs from inside the event loop
+        return nested(depth - 1, func) if depth else func()
+
+    loggers = {
+        "stack parsing": StackLogger(True, False, fmt),
+        "frame walk": Logger(True, False, fmt),
+        "tracing off": Logger(True, False, fmt, trace=False),
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = {name: timeit.timeit(lambda: nested(20, lambda: l.log("benchmark")), number=runs) for name, l in loggers.items()}
+
+    for name, total in results.items():
+        print(f"{name:>14}: {total / runs * 1e6:7.2f}us per log call")
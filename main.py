@@ -1,9 +1,24 @@
-import os
+import asyncio
+import blueprints
 import datetime
+import os
+import signal
+import time
+import traceback
 import discord
+import commands
 import common
+import dispatcher
 import logger
 import farm
+import paginator
+import placement
+import harvesting
+import leaderboard
+import metrics
+import profiling
+import scheduler
+import store
 import utils
 
 intents = discord.Intents.all()
@@ -11,499 +26,641 @@ client = discord.Client(intents=intents)
 
 logger = logger.Logger(True,
                        True,
-                       "$color[$info]$reset $timecolor[%H:%M:%S.%f]$reset $message $tracecolor($filename/$funcname:$line)$reset")
+                       "$color[$info]$reset $timecolor[%H:%M:%S.%f]$reset $message $tracecolor($filename/$funcname:$line)$reset",
+                       json_filename="latest.jsonl")
 logger.reset_log()
 
-# ----------------------------------------------------------------------------------------------------------------------
+database = store.SqliteFarmStore("farms.db")
+
+if database.created:
+    logger.log(f"Imported {store.import_json_directory(database, 'farms')} farms from the json directory")
+
+
+def log_flush_error(e: Exception):
+    logger.error("Writing cached farms to the database failed, retrying with the next flush:\n%s", traceback.format_exc())
 
-try:
-    with open("token.txt", "r") as f:
-        token = f.read()
-except:
-    logger.error("Token could not be read. Please provide a valid token inside token.txt.")
+
+farms = store.AsyncFarmStore(store.FarmCache(database, max_entries=2048, flush_interval=5.0, on_error=log_flush_error),
+                             max_workers=4)
+
+rankings = leaderboard.Leaderboard.from_store(database)
+farms.on_save.append(rankings.update_farm)
+
+schedule = scheduler.HarvestScheduler.from_store(database)
+farms.on_save.append(schedule.update_farm)
+
+stats = metrics.Metrics()
+farms.timings = stats.record_storage
+
+profiler = profiling.Profiler("profiles", top=20)
 
 # ----------------------------------------------------------------------------------------------------------------------
 
+registry = commands.CommandRegistry()
+responses = commands.ResponseCache()
+
+
+def parse_harvest(value: str) -> farm.Harvests:
+    return farm.Harvests.__getitem__(value.upper())
+
+
+def parse_sell_amount(value: str):
+    return int(value) if value.lower() != "all" else 0.69  # special flag to sell everything
+
+
+PLACE_ARGS = (
+    commands.Argument("mode"),
+    commands.Argument("start_x", int, error="Failed to parse coordinate arguments to 'int'!"),
+    commands.Argument("start_y", int, error="Failed to parse coordinate arguments to 'int'!"),
+    commands.Argument("end_x", int, error="Failed to parse coordinate arguments to 'int'!"),
+    commands.Argument("end_y", int, error="Failed to parse coordinate arguments to 'int'!"),
+    commands.Argument("item", parse_harvest, error="{value} is not a valid harvest!"),
+    commands.Argument("options", optional=True, rest=True)
+)
+
+
 class Bot:
 
     def __init__(self):
         self.prefix = "="
         self.description_filename = "description.txt"
+        self.admins = {827421329497128981}
+        self.notify: set[int] = set()  # users that get a message when their farm is ready
 
         self.load_prefix()
+        self.load_admins()
+        self.load_notify()
 
+    def is_command(self, raw: discord.Message) -> bool:
+        return raw.content.startswith(self.prefix) and not raw.author.bot
 
     async def process_message(self, raw: discord.Message):
 
         message: str = raw.content
 
-        if not message.startswith(self.prefix) or raw.author.bot:
+        if not self.is_command(raw):
             return
 
+        guild = raw.guild.id if raw.guild is not None else None
+
         # logger.log(f"Passed message {repr(message)}")
-        logger.log(f"{raw.author.name} issued the following command: {message}")
+        logger.log("%s issued the following command: %s", raw.author.name, message, user_id=raw.author.id, guild=guild)
+
+        try:
+            ctx = registry.parse(raw, self.prefix, message[len(self.prefix):])
+        except commands.ArgumentError as e:
+            await raw.reply(e.message)
+            return
 
-        command = message[self.prefix.__len__():]
-        base = command.split(" ")[0]
-        branch = command.split(" ", 1)[1] if command.split().__len__() >= 2 else None
-        branches = branch.split(" ") if branch is not None else [""]
+        if ctx is None:
+            return
+
+        if ctx.command.admin and raw.author.id not in self.admins:
+            await raw.reply("You are not allowed to use this command!")
+            return
 
-        if base == "help":
-            embed_data = {
+        start = time.perf_counter()
+        failed = True
+        profiled = profiler.is_running()  # =profile itself starts the profile, it doesn't count as a profiled command
+
+        try:
+            await ctx.command.handler(self, ctx)
+            failed = False
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            stats.record_command(ctx.command.name, duration, failed)
+            if profiled:
+                profiler.command_finished()
+            logger.event("command finished", user_id=raw.author.id, guild=guild, command=ctx.command.name,
+                         duration=round(duration, 3), error=failed)
+
+    @registry.command("help", "Displays a help menu.", usage="")
+    async def help(self, ctx: commands.Context):
+
+        async def build():
+            return await common.create_embed({
                 "title": "Theseus bot help menu",
                 "description": "Commands:",
-                "footer": {
-                    "text": f"Executed by {raw.author}",
-                    "icon_url": raw.author.avatar.url if raw.author.avatar is not None else None
-                },
-                "fields": [
-                    {
-                        "name": f"{self.prefix}help",
-                        "value": "Displays a help menu.",
-                        "inline": True
-                    },
-                    {
-                        "name": f"{self.prefix}prefix [prefix: str]",
-                        "value": "Changes the current prefix.",
-                        "inline": False
-                    },
-                    {
-                        "name": f"{self.prefix}prefixspace [prefix: str]",
-                        "value": "Changes the current prefix, but with space after the prefix.",
-                        "inline": True
-                    },
-                    {
-                        "name": f"{self.prefix}ping",
-                        "value": "Displays the latency of the bot in ms.",
-                        "inline": False
-                    },
-                    {
-                        "name": f"{self.prefix}create [name: str]",
-                        "value": "Creates a new farm.",
-                        "inline": True
-                    },
-                    {
-                        "name": f"{self.prefix}harvest",
-                        "value": "Harvests items in your farm.",
-                        "inline": False
-                    },
-                    {
-                        "name": f'{self.prefix}rename_farm [new_name: str]',
-                        "value": "Renames your current farm name.",
-                        "inline": True
-                    },
-                    {
-                        "name": f'{self.prefix}get_harvestable',
-                        "value": "Displays what items are harvestable.",
-                        "inline": False
-                    },
-                    {
-                        "name": f'{self.prefix}render [mode: str > "all"/""]',
-                        "value": 'Renders your current farm, with argument "all", every single farm that exist including inventory.',
-                        "inline": True
-                    },
-                    {
-                        "name": f'{self.prefix}place [mode: str > "fill"] [start_x] [start_y] [end_x] [end_y] [item]',
-                        "value": "Places items in your farm from your inventory. Overwritten items in the farm are stored back, and missing items are purchased automatically.",
-                        "inline": False
-                    },
-                    {
-                        "name": f'{self.prefix}sell [item] ["all"/amount: int]',
-                        "value": "Sells items from your inventory. Negative values can be used to purchase the item directly.",
-                        "inline": True
-                    },
-                    {
-                        "name": f'{self.prefix}view_description',
-                        "value": "Displays the current public description.",
-                        "inline": False
-                    },
-                    {
-                        "name": f'{self.prefix}set_description [text: str]',
-                        "value": "Edits the current public description.",
-                        "inline": True
-                    }
-                ]}
-            embed = await common.create_embed(embed_data)
-            await raw.reply(embed=embed)
-
-        elif base == "ping":
-            await raw.reply(f"Ping: {client.latency * 1000}ms")
-
-        elif base == "prefix":
-            self.prefix = str(branch)
-            self.save_prefix()
-            await raw.reply("Prefix set to " + str(branch))
-
-        elif base == "prefixspace":
-            self.prefix = str(branch) + ' '
-            self.save_prefix()
-            await raw.reply("Prefix set to " + str(branch) + " (with space)")
-
-        elif base == "create":
-            id = raw.author.id
-            author_name = raw.author.name
-            farm_name = str(branch)
+                "fields": registry.get_help_fields(self.prefix)
+            })
+
+        # the menu only changes with the prefix or the registered commands, just the footer is per author
+        embed = (await responses.get(("help", self.prefix, registry.version), build)).copy()
+        embed.timestamp = discord.utils.utcnow()
+        embed.set_footer(text=f"Executed by {ctx.raw.author}",
+                         icon_url=ctx.raw.author.avatar.url if ctx.raw.author.avatar is not None else None)
+        await ctx.reply(embed=embed)
+
+    @registry.command("prefix", "Changes the current prefix.", usage="[prefix: str]",
+                      args=[commands.Argument("prefix", rest=True)])
+    async def set_prefix(self, ctx: commands.Context):
+        if not ctx.args["prefix"].strip():
+            await ctx.reply("The prefix can not be empty!")
+            return
+
+        self.prefix = ctx.args["prefix"]
+        self.save_prefix()
+        responses.invalidate()
+        await ctx.reply("Prefix set to " + ctx.args["prefix"])
+
+    @registry.command("prefixspace", "Changes the current prefix, but with space after the prefix.", usage="[prefix: str]",
+                      args=[commands.Argument("prefix", rest=True)])
+    async def set_prefix_space(self, ctx: commands.Context):
+        if not ctx.args["prefix"].strip():
+            await ctx.reply("The prefix can not be empty!")
+            return
+
+        self.prefix = ctx.args["prefix"] + ' '
+        self.save_prefix()
+        responses.invalidate()
+        await ctx.reply("Prefix set to " + ctx.args["prefix"] + " (with space)")
+
+    @registry.command("ping", "Displays the latency of the bot in ms.", usage="")
+    async def ping(self, ctx: commands.Context):
+        await ctx.reply(f"Ping: {client.latency * 1000}ms")
+
+    @registry.command("create", "Creates a new farm.", usage="[name: str]",
+                      args=[commands.Argument("name", optional=True, rest=True)])
+    async def create(self, ctx: commands.Context):
+        id = ctx.raw.author.id
+        farm_name = ctx.args["name"]
+        f = await farms.load(id)
+        existed = True
+
+        if f is None:
+
+            if not farm_name:
+                await ctx.reply(f"Please provide a name for your farm, with syntax '{self.prefix}create [name]'")
+                return
+
             f = farm.Farm(farm_name, 1, datetime.datetime.now())
-            filename = os.path.join('farms', str(id) + '.json')
-            existed = True
+            await farms.save(id, f)
+            existed = False
 
-            try:
-                f.load(filename)
-            except FileNotFoundError:
+        if existed:
+            await ctx.reply(f"You already have a farm!")
+        else:
+            await ctx.reply(f"Created farm for user '{ctx.raw.author.name}' with name '{farm_name}'")
 
-                if not branch:
-                    await raw.reply("Please provide a name for your farm, with syntax '=create [name]'")
-                    return
+        await ctx.reply(f.render())
 
-                f.save(filename)
-                existed = False
+    @registry.command("harvest", "Harvests items in your farm.", usage="")
+    async def harvest(self, ctx: commands.Context):
+        f = await farms.load(ctx.raw.author.id)
 
-            if existed:
-                await raw.reply(f"You already have a farm!")
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
+
+        a = f.decompile_harvest_result(harvesting.harvest(f))
+
+        logger.log(a)
+        await ctx.reply(a)
+        await farms.save(ctx.raw.author.id, f)
+
+    @registry.command("rename_farm", "Renames your current farm name.", usage="[new_name: str]", aliases=["rename"],
+                      args=[commands.Argument("new_name", optional=True, rest=True)])
+    async def rename_farm(self, ctx: commands.Context):
+        new_name = ctx.args["new_name"]
+
+        if not new_name:
+            await ctx.reply(f"Please provide a name for your farm, with syntax '{self.prefix}rename_farm [new_name]'")
+            return
+
+        id = ctx.raw.author.id
+        f = await farms.load(id)
+
+        if f is None:
+            await ctx.reply('Your farm has not been found!')
+            return
+
+        f.name = new_name
+        await farms.save(id, f)
+
+        await ctx.reply(f"Successfully renamed your farm to {new_name}!")
+
+    @registry.command("ready", "Displays when your farm can be harvested next.", usage="")
+    async def ready(self, ctx: commands.Context):
+        user_id = ctx.raw.author.id
+        timestamp = schedule.get_next_ready(user_id)
+
+        if timestamp is None:
+            if not await farms.exists(user_id):
+                await ctx.reply('You currently have no farm!')
             else:
-                await raw.reply(f"Created farm for user '{raw.author.name}' with name '{str(branch)}'")
+                await ctx.reply('Nothing is growing on your farm!')
+            return
 
-            await raw.reply(f.render())
+        crops = [f":{crop}:" for crop, ready in schedule.get_ready_times(user_id).items() if ready <= max(timestamp, time.time())]
+        remaining = timestamp - time.time()
 
-        elif base == "rename_farm":
+        if remaining <= 0:
+            await ctx.reply(f"Your farm is ready to harvest! ({', '.join(crops)})")
+        else:
+            await ctx.reply(f"Your farm is ready in {datetime.timedelta(seconds=round(remaining))} ({', '.join(crops)})")
 
-            if not branch:
-                await raw.reply("Please provide a name for your farm, with syntax '=rename_farm [new_name]'")
+    @registry.command("notify", "Toggles a direct message when your farm is ready to harvest.", usage="")
+    async def toggle_notify(self, ctx: commands.Context):
+        user_id = ctx.raw.author.id
 
-            try:
-                id = raw.author.id
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(id) + '.json'))
-                f.name = str(branch)
-                f.save(f'farms/{str(id)}.json')
-            except FileNotFoundError:
-                await raw.reply('Your farm has not been found!')
-                return
+        if user_id in self.notify:
+            self.notify.discard(user_id)
+            await ctx.reply("You will no longer be notified.")
+        else:
+            self.notify.add(user_id)
+            await ctx.reply("You will be notified when your farm is ready to harvest.")
 
-            await raw.reply(f"Successfully renamed your farm to {str(branch)}!")
+        self.save_notify()
 
-        elif base == "get_harvestable":
+    @registry.command("get_harvestable", "Displays what items are harvestable.", usage="")
+    async def get_harvestable(self, ctx: commands.Context):
+        f = await farms.load(ctx.raw.author.id)
 
-            try:
-                id = raw.author.id
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(id) + '.json'))
-            except FileNotFoundError:
-                await raw.reply('Your farm has not been found!')
-                return
+        if f is None:
+            await ctx.reply('Your farm has not been found!')
+            return
 
-            m = ""
+        m = ""
 
-            for _, value in enumerate(f.get_all_harvestable_time()):
-                m += f":{value}: can be harvested in {f.get_all_harvestable_time()[value]}\n"
+        for name, remaining in f.get_all_harvestable_time().items():
+            m += f":{name}: can be harvested in {remaining}\n"
 
-            await raw.reply(m)
+        await ctx.reply(m)
 
-        elif base == "render":
-            if str(branch) == "all":
-                message = ''
-                f = farm.Farm()
-                for filename in os.listdir('farms'):
-                    f.load(os.path.join('farms', filename))
+    @registry.command("render", 'Renders your current farm, with argument "all", every single farm that exist including inventory.',
+                      usage='[mode: str > "all"/""]', args=[commands.Argument("mode", optional=True)])
+    async def render(self, ctx: commands.Context):
+        if ctx.args["mode"] == "all":
+            view = paginator.PageView(paginator.iter_render_all(farms, get_user_name))
 
-                    message += ('[' + str(f.level) + ']' + ' '
-                                + f.name + ' (' + client.get_user(int(filename.split('.', 1)[0])).name + ')' + '\n'
-                                + f.decompile_total_harvests() + '\n'
-                                + '[' + str(f.get_total_harvests()) + '/' + str(f.get_inventory_limit()) + ']' + '\n'
-                                + f.render() + '\n')
+            if not await view.send(ctx.raw):
+                await ctx.reply("No farms found!")
+            return
 
-                await raw.reply(message if message != '' else "No farms found!")
-                return
+        f = await farms.load(ctx.raw.author.id)
 
-            try:
-                id = raw.author.id
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(id) + '.json'))
-            except FileNotFoundError:
-                await raw.reply('Your farm has not been found!')
-                return
+        if f is None:
+            await ctx.reply('Your farm has not been found!')
+            return
 
-            await raw.reply(f.render())
+        await ctx.reply(f.render())
 
-        elif base == "harvest":
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(raw.author.id) + ".json"))
+    @registry.command("upgrade", "Upgrades your farm to the next level.", usage="")
+    async def upgrade(self, ctx: commands.Context):
+        f = await farms.load(ctx.raw.author.id)
 
-                a = f.decompile_harvest_result(f.harvest())
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
 
-                logger.log(a)
-                await raw.reply(a)
-                f.save(f'farms/{str(raw.author.id)}.json')
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
-                return
+        cost = f.get_level_cost(f.level + 1)
+
+        if f.harvests["moneybag"] - cost < 0:
+            await ctx.reply(f"You don't have enough money to upgrade your farm to level {f.level + 1}! ({cost} needed, you only have {f.harvests['moneybag']}:moneybag:)")
             return
 
-        elif base == "upgrade":
+        f.level += 1
 
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(raw.author.id) + ".json"))
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
-                return
+        for _ in range(f.get_level_cost(f.level)):
+            f.farm.append(farm.Harvests.GREEN_SQUARE)
 
-            cost = f.get_level_cost(f.level + 1)
+        f.harvests["moneybag"] -= cost
+        await farms.save(ctx.raw.author.id, f)
 
-            if f.harvests["moneybag"] - cost < 0:
-                await raw.reply(f"You don't have enough money to upgrade your farm to level {f.level + 1}! ({cost} needed, you only have {f.harvests['moneybag']}:moneybag:)")
-                return
+        await ctx.reply(f"Successfully upgraded you farm to level {f.level} (-{cost}:moneybag:)")
 
-            f.level += 1
+    @registry.command("place", "Places items in your farm from your inventory. Overwritten items in the farm are stored back, and missing items are purchased automatically.",
+                      usage='[mode: str > "fill"/"/"/"\\"/"border"/"mask"] [start_x] [start_y] [end_x] [end_y] [item] [mask: str > "101,010"] ["dry"]',
+                      args=PLACE_ARGS)
+    async def place(self, ctx: commands.Context):
+        await self.place_shape(ctx, ctx.raw.author.id)
 
-            for _ in range(f.get_level_cost(f.level)):
-                f.farm.append(farm.Harvests.GREEN_SQUARE)
+    @registry.command("blueprint", "Saves a part of your farm as a blueprint anyone can stamp onto their farm in one go.",
+                      usage='["save" [name] [start_x] [start_y] [end_x] [end_y] / "stamp" [name] [x] [y] ["dry"] / "list" / "delete" [name]]',
+                      args=[commands.Argument("action"),
+                            commands.Argument("name", optional=True),
+                            commands.Argument("options", optional=True, rest=True)])
+    async def blueprint(self, ctx: commands.Context):
+        action = ctx.args["action"].lower()
+        name = ctx.args["name"].lower() if ctx.args["name"] else None
+        options = (ctx.args["options"] or "").split()
+        user_id = ctx.raw.author.id
 
-            f.harvests["moneybag"] -= cost
-            f.save(f'farms/{str(raw.author.id)}.json')
+        if action == "list":
+            saved = await farms.list_blueprints()
+            view = paginator.PageView(paginator.iter_pages("".join(f"{name} by {get_user_name(owner)}\n" for name, owner in saved)))
 
-            await raw.reply(f"Successfully upgraded you farm to level {f.level} (-{cost}:moneybag:)")
+            if not await view.send(ctx.raw):
+                await ctx.reply("No blueprints found!")
+            return
 
-        elif base == "place":
+        if action not in ("save", "stamp", "delete"):
+            await ctx.reply(f"{action} is not a valid action! send {ctx.prefix}help for help.")
+            return
 
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(raw.author.id) + ".json"))
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
-                return
+        if name is None or not blueprints.NAME.fullmatch(name):
+            await ctx.reply("Please provide a blueprint name of up to 32 letters, digits, - or _!")
+            return
 
-            if len(branches) < 6:
-                await raw.reply(f"Too few arguments! send {self.prefix}help for help.")
-                return
+        existing = await farms.load_blueprint(name)
+
+        if action == "delete":
+            if existing is None:
+                await ctx.reply(f"Blueprint {name} has not been found!")
+            elif existing.owner != user_id and user_id not in self.admins:
+                await ctx.reply(f"Blueprint {name} belongs to {get_user_name(existing.owner)}!")
+            else:
+                await farms.delete_blueprint(name)
+                await ctx.reply(f"Deleted blueprint {name}.")
+            return
 
-            mode = branches[0]
+        dry_run = any(option.lower() in ("dry", "dry-run") for option in options)
+        numbers = [option for option in options if option.lower() not in ("dry", "dry-run")]
 
-            if mode.lower() not in farm.PLACE_MODE:
-                await raw.reply(f"{mode.lower()} not in place mode, available: {farm.PLACE_MODE}")
+        try:
+            coordinates = [int(number) for number in numbers]
+        except ValueError:
+            await ctx.reply("Failed to parse coordinate arguments to 'int'!")
+            return
+
+        if len(coordinates) != (4 if action == "save" else 2):
+            await ctx.reply(f"Too few arguments! send {ctx.prefix}help for help.")
+            return
+
+        f = await farms.load(user_id)
+
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
+
+        if action == "save":
+            if existing is not None and existing.owner != user_id:
+                await ctx.reply(f"Blueprint {name} belongs to {get_user_name(existing.owner)}!")
                 return
 
             try:
-                start_x = int(branches[1])
-                start_y = int(branches[2])
-                end_x = int(branches[3])
-                end_y = int(branches[4])
-            except ValueError:
-                await raw.reply("Failed to parse coordinate arguments to 'int'!")
+                captured = blueprints.Blueprint.capture(f, name, user_id, *coordinates)
+            except placement.PlacementError as e:
+                await ctx.reply(e.message)
                 return
 
-            if (start_x >= f.get_farm_length_from_level(f.level)[0]
-                    or start_x < 0):
-                await raw.reply(f"Start position {start_x} (x) is out of bounds!")
-                return
+            await farms.save_blueprint(captured)
+            await ctx.reply(f"Saved blueprint {name} ({captured.describe()})")
+            return
 
-            if (start_y >= f.get_farm_length_from_level(f.level)[1]
-                    or start_y < 0):
-                await raw.reply(f"Start position {start_y} (y) is out of bounds!")
-                return
+        if existing is None:
+            await ctx.reply(f"Blueprint {name} has not been found!")
+            return
 
-            if (end_x >= f.get_farm_length_from_level(f.level)[0]
-                    or end_x < 0):
-                await raw.reply(f"End position {end_x} (x) is out of bounds!")
-                return
+        try:
+            plans = blueprints.stamp(f, existing, *coordinates, dry_run=dry_run)
+        except placement.PlacementError as e:
+            await ctx.reply(e.message)
+            return
 
-            if (end_y >= f.get_farm_length_from_level(f.level)[1]
-                    or end_y < 0):
-                await raw.reply(f"End position {end_y} (y) is out of bounds!")
-                return
+        if dry_run:
+            await ctx.reply(f"Stamping {name} would take: {placement.describe(*plans)}")
+            return
 
-            harvest = branches[5]
+        if any(p.changed for p in plans):
+            await farms.save(user_id, f)
 
-            try:
-                parsed_harvest = farm.Harvests.__getitem__(harvest.upper())
-            except KeyError:
-                await raw.reply(f"{harvest} is not a valid harvest!")
-                return
+        await ctx.reply(f"Stamped {name}! ({placement.describe(*plans)})")
 
-            if mode == "fill":
+    @registry.command("sell", "Sells items from your inventory. Negative values can be used to purchase the item directly.",
+                      usage='[item] ["all"/amount: int]',
+                      args=[commands.Argument("item", parse_harvest, error="{value} is not a valid item to sell!"),
+                            commands.Argument("amount", parse_sell_amount, error="{value} is not a valid number to sell! send {prefix}help for more help.")])
+    async def sell(self, ctx: commands.Context):
+        parsed_item = ctx.args["item"]
+        sell_amount = ctx.args["amount"]
 
-                failed = []
+        if parsed_item.value.plantable == farm.Plantable.UNOBTAINABLE:
+            await ctx.reply(f"{parsed_item.name.lower()} can not be obtained but sold???")
+            await ctx.reply(f"<@827421329497128981>")
+            return
 
-                for y in range(start_y, end_y + 1):
-                    for x in range(start_x, end_x + 1):
-                        i = y * f.get_farm_length_from_level(f.level)[0] + x
-                        # print(x, y, i, parsed_harvest)
+        f = await farms.load(ctx.raw.author.id)
 
-                        if not f.set_index(i, parsed_harvest):
-                            failed.append(f"{parsed_harvest.name} at {i}")
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
 
-                f.save(f'farms/{str(raw.author.id)}.json')
+        inventory_amount = f.harvests.get(parsed_item.name.lower(), 0)
 
-                failed_str = "\n".join(failed)
-                await raw.reply(f"Finished placing!\n\nFailed farm squares:\n{failed_str}")
+        if inventory_amount <= 0:
+            await ctx.reply("You don't have any of that item!")
+            return
 
-            else:
+        if sell_amount == 0.69:
 
-                await raw.reply(f"Place mode {mode} is currently unsupported.")
+            f.harvests[parsed_item.name.lower()] = 0
+            f.harvests["moneybag"] += (inventory_amount * parsed_item.value.price)
 
-        elif base == "sell":
+            await ctx.reply(f"Success! (:moneybag:+{inventory_amount * parsed_item.value.price}, :{parsed_item.name.lower()}:0)")
+        else:
 
-            if len(branches) < 2:
-                await raw.reply(f"Too few arguments! send {self.prefix}help for help.")
+            if inventory_amount < sell_amount:
+                await ctx.reply(f"You cannot sell more amounts then you have! ({inventory_amount} in inventory, tried to sell {sell_amount})")
                 return
 
-            raw_item = branches[0]
+            f.harvests[parsed_item.name.lower()] -= sell_amount
+            f.harvests["moneybag"] += (sell_amount * parsed_item.value.price)
 
-            try:
-                parsed_item = farm.Harvests.__getitem__(raw_item.upper())
-            except KeyError:
-                await raw.reply(f"{raw_item} is not a valid item to sell!")
-                return
+            await ctx.reply(f"Success! (:moneybag:+{sell_amount * parsed_item.value.price}, :{parsed_item.name.lower()}:{f.harvests[parsed_item.name.lower()]})")
 
-            if parsed_item.value.plantable == farm.Plantable.UNOBTAINABLE:
-                await raw.reply(f"{parsed_item.name.lower()} can not be obtained but sold???")
-                await raw.reply(f"<@827421329497128981>")
-                return
+        await farms.save(ctx.raw.author.id, f)
 
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(raw.author.id) + ".json"))
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
-                return
+    @registry.command("view_description", "Displays the current public description.", usage="")
+    async def view_description(self, ctx: commands.Context):
 
-            try:
-                sell_amount = int(branches[1]) if branches[1].lower() != "all" else 0.69 # special flag to sell everything
-            except ValueError:
-                await raw.reply(f"{branches[1]} is not a valid number to sell! send {self.prefix}help for more help.")
-                return
+        created = False
 
-            inventory_amount = f.harvests[parsed_item.name.lower()]
+        async def build():
+            nonlocal created
+            created = not os.path.exists(self.description_filename)
+            return self.load_description()
 
-            if inventory_amount <= 0:
-                await raw.reply("You don't have any of that item!")
-                return
+        await ctx.reply(await responses.get("description", build))
 
-            if sell_amount == 0.69:
+        if created:
+            responses.invalidate("description")  # the creation notice is a one off, the next call reads the new file
 
-                f.harvests[parsed_item.name.lower()] = 0
-                f.harvests["moneybag"] += (inventory_amount * parsed_item.value.price)
+    @registry.command("set_description", "Edits the current public description.", usage="[text: str]",
+                      args=[commands.Argument("text", rest=True)])
+    async def set_description(self, ctx: commands.Context):
+        text = ctx.args["text"]
 
-                await raw.reply(f"Success! (:moneybag:+{inventory_amount * parsed_item.value.price}, :{parsed_item.name.lower()}:0)")
-            else:
+        diff = utils.generate_diff(self.load_description(), text)
+
+        logger.log(diff)
+        await ctx.reply(diff)
+
+        self.save_description(text)
+        responses.invalidate("description")
+        await ctx.reply("Finished!")
 
-                if inventory_amount < sell_amount:
-                    await raw.reply(f"You cannot sell more amounts then you have! ({inventory_amount} in inventory, tried to sell {sell_amount})")
-                    return
+    @registry.command("top", "Displays the top 10 farms, ranked by money if no metric is given.",
+                      usage='[metric: str > "money"/"level"/"inventory"/"tiles"]', aliases=["leaderboard"],
+                      args=[commands.Argument("metric", optional=True)])
+    async def top(self, ctx: commands.Context):
+        name = ctx.args["metric"] or "money"
+        metric = leaderboard.ALIASES.get(name.lower())
 
-                f.harvests[parsed_item.name.lower()] -= sell_amount
-                f.harvests["moneybag"] += (sell_amount * parsed_item.value.price)
+        if metric is None:
+            await ctx.reply(f"{name} is not a valid ranking, available: {', '.join(leaderboard.METRICS)}")
+            return
 
-                await raw.reply(f"Success! (:moneybag:+{sell_amount * parsed_item.value.price}, :{parsed_item.name.lower()}:{f.harvests[parsed_item.name.lower()]})")
+        top = rankings.top(metric, 10)
 
-            f.save(f'farms/{str(raw.author.id)}.json')
+        if not top:
+            await ctx.reply("No farms found!")
+            return
 
-        elif base == "view_description":
-            await raw.reply(self.load_description())
+        lines = [f"#{i + 1} {get_user_name(user_id)}: {value}" for i, (user_id, value) in enumerate(top)]
 
-        elif base == "set_description":
+        rank = rankings.get_rank(metric, ctx.raw.author.id)
+        if rank is not None:
+            lines.append(f"\nYou are #{rank} of {len(rankings)}")
 
-            logger.log(f"{utils.generate_diff(self.load_description(), str(branch))}")
-            await raw.reply(f"{utils.generate_diff(self.load_description(), str(branch))}")
+        await ctx.reply(f"Top farms by {metric}:\n" + "\n".join(lines))
 
-            self.save_description(str(branch))
-            await raw.reply("Finished!")
+    @registry.command("stats", "Displays per command latency and throughput.", admin=True)
+    async def show_stats(self, ctx: commands.Context):
+        cache = farms.store.stats()
+        footer = (f"\nfarm cache: {cache['entries']} farms ({cache['tiles']} tiles), {cache['dirty']} dirty, "
+                  f"{cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%}), {cache['writes']} writes")
 
-        elif base == "upgradet":
+        await ctx.reply(stats.render(paginator.MESSAGE_LIMIT - len(footer)) + footer)
 
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', "843395659487117323" + ".json"))
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
+    @registry.command("profile", "Profiles every command for some seconds or commands, or until stopped.",
+                      usage='[action: str > "seconds"/"commands"/"stop"] [amount: int]', admin=True,
+                      args=[commands.Argument("action"),
+                            commands.Argument("amount", int, optional=True, error="Failed to parse amount to 'int'!")])
+    async def profile(self, ctx: commands.Context):
+        action = ctx.args["action"].lower()
+        amount = ctx.args["amount"]
+
+        if action == "stop":
+            result = profiler.stop()
+
+            if result is None:
+                await ctx.reply("No profile is running!")
                 return
 
-            f.level += 1
+            await self.send_summary(ctx, *result)
+            return
 
-            for _ in range(f.get_level_cost(f.level)):
-                f.farm.append(farm.Harvests.GREEN_SQUARE)
+        if action not in ("seconds", "commands"):
+            await ctx.reply(f"{action} is not a valid action! send {ctx.prefix}help for help.")
+            return
 
-            f.save(f'farms/{str("843395659487117323")}.json')
+        if amount is None or amount <= 0:
+            await ctx.reply("Please provide a positive amount!")
+            return
 
-        elif base == "placet":
+        if not profiler.start(commands=amount if action == "commands" else None):
+            await ctx.reply("A profile is already running!")
+            return
 
-            try:
-                f = farm.Farm()
-                f.load(os.path.join('farms', str(843395659487117323) + ".json"))
-            except FileNotFoundError:
-                await raw.reply('You currently have no farm!')
-                return
+        await ctx.reply(f"Profiling the next {amount} {action}...")
 
-            if len(branches) < 6:
-                await raw.reply(f"Too few arguments! send {self.prefix}help for help.")
-                return
+        # waiting here would block every other command of this user, so the report runs on its own
+        asyncio.create_task(self.report_profile(ctx, profiler.profile, amount if action == "seconds" else None))
 
-            mode = branches[0]
+    async def report_profile(self, ctx: commands.Context, profile, seconds: int | None):
+        await profiler.wait(seconds)
 
-            if mode.lower() not in farm.PLACE_MODE:
-                await raw.reply(f"{mode.lower()} not in place mode, available: {farm.PLACE_MODE}")
-                return
+        if profiler.profile is not profile:
+            return  # already stopped and reported by whoever stopped it
 
-            try:
-                start_x = int(branches[1])
-                start_y = int(branches[2])
-                end_x = int(branches[3])
-                end_y = int(branches[4])
-            except ValueError:
-                await raw.reply("Failed to parse coordinate arguments to 'int'!")
-                return
+        await self.send_summary(ctx, *profiler.stop())
 
-            if (start_x >= f.get_farm_length_from_level(f.level)[0]
-                    or start_x < 0):
-                await raw.reply(f"Start position {start_x} (x) is out of bounds!")
-                return
+    @registry.command("memory", "Traces allocations, snapshot shows the growth since start.",
+                      usage='[action: str > "start"/"snapshot"/"stop"] [top: int]', admin=True,
+                      args=[commands.Argument("action"),
+                            commands.Argument("top", int, optional=True, error="Failed to parse top to 'int'!")])
+    async def memory(self, ctx: commands.Context):
+        action = ctx.args["action"].lower()
 
-            if (start_y >= f.get_farm_length_from_level(f.level)[1]
-                    or start_y < 0):
-                await raw.reply(f"Start position {start_y} (y) is out of bounds!")
-                return
+        if action == "start":
+            started = profiler.start_tracing()
+            await ctx.reply("Tracing allocations." if started else "Allocations are already traced!")
 
-            if (end_x >= f.get_farm_length_from_level(f.level)[0]
-                    or end_x < 0):
-                await raw.reply(f"End position {end_x} (x) is out of bounds!")
-                return
+        elif action == "snapshot":
+            result = profiler.snapshot(ctx.args["top"])
 
-            if (end_y >= f.get_farm_length_from_level(f.level)[1]
-                    or end_y < 0):
-                await raw.reply(f"End position {end_y} (y) is out of bounds!")
+            if result is None:
+                await ctx.reply(f"Allocations are not traced, send {ctx.prefix}memory start first!")
                 return
 
-            harvest = branches[5]
+            await self.send_summary(ctx, *result)
 
-            try:
-                parsed_harvest = farm.Harvests.__getitem__(harvest.upper())
-            except KeyError:
-                await raw.reply(f"{harvest} is not a valid harvest!")
-                return
+        elif action == "stop":
+            stopped = profiler.stop_tracing()
+            await ctx.reply("Stopped tracing allocations." if stopped else "Allocations are not traced!")
 
-            if mode == "fill":
+        else:
+            await ctx.reply(f"{action} is not a valid action! send {ctx.prefix}help for help.")
 
-                failed = []
+    async def send_summary(self, ctx: commands.Context, filename: str, summary: str):
+        header = f"Written to {filename}\n```\n"
+        footer = "\n```"
+        room = paginator.MESSAGE_LIMIT - len(header) - len(footer)
 
-                for y in range(start_y, end_y + 1):
-                    for x in range(start_x, end_x + 1):
-                        i = y * f.get_farm_length_from_level(f.level)[0] + x
-                        # print(x, y, i, parsed_harvest)
+        if len(summary) > room:
+            summary = summary[:room - 4].rsplit("\n", 1)[0] + "\n..."
 
-                        if not f.set_indext(i, parsed_harvest):
-                            failed.append(f"{parsed_harvest.name} at {i}")
+        await ctx.reply(header + summary + footer)
 
-                f.save(f'farms/{str(843395659487117323)}.json')
+    @registry.command("upgradet", hidden=True)
+    async def upgrade_test(self, ctx: commands.Context):
+        f = await farms.load(843395659487117323)
 
-                failed_str = "\n".join(failed)
-                await raw.reply(f"Finished placing!\n\nFailed farm squares:\n{failed_str}")
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
 
-            else:
+        f.level += 1
+
+        for _ in range(f.get_level_cost(f.level)):
+            f.farm.append(farm.Harvests.GREEN_SQUARE)
 
-                await raw.reply(f"Place mode {mode} is currently unsupported.")
+        await farms.save(843395659487117323, f)
 
+    @registry.command("placet", hidden=True, args=PLACE_ARGS)
+    async def place_test(self, ctx: commands.Context):
+        await self.place_shape(ctx, 843395659487117323, free=True)
 
+    async def place_shape(self, ctx: commands.Context, user_id: int, free=False):
+        f = await farms.load(user_id)
+
+        if f is None:
+            await ctx.reply('You currently have no farm!')
+            return
+
+        # anything after the item: "dry" only prices the placement, any other word is the mask
+        options = (ctx.args["options"] or "").split()
+        dry_run = any(option.lower() in ("dry", "dry-run") for option in options)
+        mask = next((option for option in options if option.lower() not in ("dry", "dry-run")), None)
+
+        try:
+            placed = placement.place(f, ctx.args["mode"].lower(), ctx.args["start_x"], ctx.args["start_y"], ctx.args["end_x"],
+                                     ctx.args["end_y"], ctx.args["item"], mask=mask, free=free, dry_run=dry_run)
+        except placement.PlacementError as e:
+            await ctx.reply(e.message)
+            return
+
+        if dry_run:
+            money = f.harvests.get("moneybag", 0)
+            affordable = "" if placed.cost <= money else f"\nYou only have {money}:moneybag:, that is not enough!"
+            await ctx.reply(f"Placing would take: {placed.describe()}{affordable}")
+            return
+
+        if placed.changed:
+            await farms.save(user_id, f)
+
+        await ctx.reply(f"Finished placing! ({placed.describe()})")
 
     def save_description(self, text: str):
         with open(self.description_filename, "w", encoding="utf-8") as f:
@@ -530,10 +687,42 @@ class Bot:
         except FileNotFoundError:
             return "="
 
+    def load_admins(self):
+        # admins.txt: one user id per line, on top of the default admin
+        try:
+            with open("admins.txt", "r") as f:
+                self.admins.update(int(line) for line in f.read().split() if line.isdecimal())
+        except FileNotFoundError:
+            pass
+
+    def save_notify(self):
+        with open("notify.txt", "w") as f:
+            f.write("\n".join(str(user_id) for user_id in sorted(self.notify)))
+
+    def load_notify(self):
+        # notify.txt: one user id per line
+        try:
+            with open("notify.txt", "r") as f:
+                self.notify.update(int(line) for line in f.read().split() if line.isdecimal())
+        except FileNotFoundError:
+            pass
+
+
+def get_user_name(user_id: int) -> str:
+    user = client.get_user(user_id)
+    return user.name if user is not None else str(user_id)
+
 
 bot = Bot()
 
 
+def log_command_error(raw: discord.Message, e: Exception):
+    logger.error("Command %r issued by %s failed:\n%s", raw.content, raw.author.name, traceback.format_exc())
+
+
+actors = dispatcher.Dispatcher(bot.process_message, idle_timeout=60.0, on_error=log_command_error)
+
+
 @client.event
 async def on_ready():
 
@@ -544,12 +733,81 @@ async def on_ready():
 
 @client.event
 async def on_message(raw):
-    await bot.process_message(raw)
+    if not bot.is_command(raw):
+        return
+
+    # every user gets their own queue, so their commands never interleave
+    actors.dispatch(raw.author.id, raw)
+
+
+def toggle_profile():
+    # SIGUSR1: starts profiling, the next one stops it and logs the summary
+    result = profiler.toggle()
+
+    if result is None:
+        logger.log("Profiling started by signal")
+    else:
+        logger.log("Profile written to %s\n%s", *result)
+
+
+async def notify_ready(due: dict[int, list[str]]):
+    # one sweep of the harvest scheduler, only users that opted in with =notify get a message
+
+    async def send(user_id: int, crops: list[str]):
+        try:
+            user = client.get_user(user_id) or await client.fetch_user(user_id)
+            await user.send(f"Your farm is ready to harvest! ({', '.join(f':{crop}:' for crop in crops)})")
+        except discord.HTTPException:
+            logger.warn("Could not notify %s that their farm is ready", user_id, user_id=user_id)
+
+    await asyncio.gather(*(send(user_id, crops) for user_id, crops in due.items() if user_id in bot.notify))
+
+
+def log_notify_error(due: dict[int, list[str]], e: Exception):
+    logger.error("Notifying %d users of ready crops failed:\n%s", len(due), traceback.format_exc())
+
+
+schedule.on_ready = notify_ready
+schedule.on_error = log_notify_error
+
+
+async def run(token: str):
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, toggle_profile)
+    except (AttributeError, NotImplementedError):
+        pass  # no SIGUSR1 or signal handlers on windows
+
+    schedule.start()
+
+    async with client:
+        try:
+            await client.start(token)
+        finally:
+            # while the client is still open, queued commands can still reply and mark their farms dirty
+            await schedule.close()
+            await actors.close()
+
+
+def main():
+    try:
+        with open("token.txt", "r") as f:
+            token = f.read()
+    except:
+        logger.error("Token could not be read. Please provide a valid token inside token.txt.")
+        return
+
+    discord.utils.setup_logging()
+
+    try:
+        asyncio.run(run(token))
+    except KeyboardInterrupt:
+        pass
 
+    logger.log(lambda: f"Farm cache stats: {farms.store.stats()}")
+    farms.close()
+    logger.close()
 
-try:
-    os.mkdir('farms')
-except FileExistsError:
-    pass
 
-client.run(token)
+# importing this module only sets the bot up, so the benchmarks can drive it without connecting
+if __name__ == '__main__':
+    main()
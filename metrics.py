@@ -0,0 +1,111 @@
+import time
+from bisect import bisect_left
+
+
+# upper bounds of the latency buckets in ms, the last bucket catches everything slower
+BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+class Histogram:
+    # fixed-size latency histogram, percentiles are reported as the upper bound of their bucket
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect_left(BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+
+        target = p / 100 * self.count
+        seen = 0
+
+        for bound, amount in zip(BOUNDS, self.counts):
+            seen += amount
+            if seen >= target:
+                return min(bound, self.max)
+
+        return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class CommandStats:
+
+    __slots__ = ("errors", "latency")
+
+    def __init__(self):
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.commands: dict[str, CommandStats] = {}
+        self.storage: dict[str, Histogram] = {}
+
+    def record_command(self, name: str, ms: float, error=False):
+        stats = self.commands.get(name)
+
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+
+        stats.latency.record(ms)
+
+        if error:
+            stats.errors += 1
+
+    def record_storage(self, operation: str, ms: float):
+        histogram = self.storage.get(operation)
+
+        if histogram is None:
+            histogram = self.storage[operation] = Histogram()
+
+        histogram.record(ms)
+
+    def get_uptime(self) -> float:
+        return time.monotonic() - self.started
+
+    def render(self, limit: int = None) -> str:
+        # limit: most characters of the result, rows are dropped from the end to fit
+        uptime = self.get_uptime()
+        lines = [f"uptime {uptime:.0f}s",
+                 "",
+                 f"{'command':<16}{'count':>7}{'err':>5}{'/min':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}"]
+
+        for name, stats in sorted(self.commands.items(), key=lambda item: -item[1].latency.count):
+            latency = stats.latency
+            lines.append(f"{name:<16}{latency.count:>7}{stats.errors:>5}{latency.count / uptime * 60:>9.1f}"
+                         f"{latency.percentile(50):>8.1f}{latency.percentile(95):>8.1f}{latency.percentile(99):>8.1f}{latency.max:>9.1f}")
+
+        if self.storage:
+            lines += ["", f"{'storage':<16}{'count':>7}{'':>5}{'mean':>9}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>9}"]
+
+            for name, latency in sorted(self.storage.items()):
+                lines.append(f"{name:<16}{latency.count:>7}{'':>5}{latency.mean():>9.2f}"
+                             f"{latency.percentile(50):>8.1f}{latency.percentile(95):>8.1f}{latency.percentile(99):>8.1f}{latency.max:>9.1f}")
+
+        header = "```\n"
+        footer = "\n```\nlatencies in ms, percentiles are bucket upper bounds"
+
+        if limit is not None and len(header + "\n".join(lines) + footer) > limit:
+            while lines and len(header + "\n".join(lines + ["..."]) + footer) > limit:
+                lines.pop()
+            lines.append("...")
+
+        return header + "\n".join(lines) + footer
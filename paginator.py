@@ -0,0 +1,134 @@
+import asyncio
+
+import discord
+
+import farm
+import store
+
+
+MESSAGE_LIMIT = 2000  # discord's limit for the content of one message
+FOOTER_RESERVE = 32  # room kept free on every page for the page counter
+
+
+def render_summary(f: farm.Farm, owner: str) -> str:
+    return ('[' + str(f.level) + ']' + ' '
+            + f.name + ' (' + owner + ')' + '\n'
+            + f.decompile_total_harvests() + '\n'
+            + '[' + str(f.get_total_harvests()) + '/' + str(f.get_inventory_limit()) + ']' + '\n'
+            + f.render() + '\n')
+
+
+def split_block(block: str, limit: int):
+    # cuts a block into pieces of at most `limit` characters, on line ends where possible
+    piece = ''
+
+    for line in block.splitlines(keepends=True):
+
+        while len(line) > limit:
+            if piece:
+                yield piece
+                piece = ''
+            yield line[:limit]
+            line = line[limit:]
+
+        if len(piece) + len(line) > limit:
+            yield piece
+            piece = ''
+
+        piece += line
+
+    if piece:
+        yield piece
+
+
+async def iter_render_all(farms: store.AsyncFarmStore, get_owner, batch_size=5, limit=MESSAGE_LIMIT - FOOTER_RESERVE):
+    # yields the summary of every farm page by page, farms are only loaded when the next page is asked for
+    # get_owner: callable(user_id) -> str
+    after = 0
+    page = ''
+
+    while True:
+        user_ids = await farms.user_ids_after(after, batch_size)
+
+        if not user_ids:
+            break
+
+        after = user_ids[-1]
+
+        for user_id, f in await farms.load_many(user_ids, concurrency=batch_size):
+            for piece in split_block(render_summary(f, get_owner(user_id)), limit):
+
+                if len(page) + len(piece) > limit:
+                    yield page
+                    page = ''
+
+                page += piece
+
+    if page:
+        yield page
+
+
+async def iter_pages(block: str, limit=MESSAGE_LIMIT - FOOTER_RESERVE):
+    # pages of text that is already known, for a PageView
+    for piece in split_block(block, limit):
+        yield piece
+
+
+class PageView(discord.ui.View):
+    # previous/next buttons over an async iterator of pages, pages are pulled on demand and kept for going back
+
+    def __init__(self, source, timeout=180.0):
+        super().__init__(timeout=timeout)
+
+        self.source = source
+        self.pages = []
+        self.exhausted = False
+        self.index = 0
+        self.message: discord.Message | None = None
+        self.lock = asyncio.Lock()  # every button click is its own task, only one of them may pull from the source
+
+    async def get_page(self, index: int) -> str | None:
+        async with self.lock:
+            while len(self.pages) <= index and not self.exhausted:
+                try:
+                    self.pages.append(await anext(self.source))
+                except StopAsyncIteration:
+                    self.exhausted = True
+
+        return self.pages[index] if index < len(self.pages) else None
+
+    def format_page(self) -> str:
+        total = str(len(self.pages)) if self.exhausted else '?'
+        return f"{self.pages[self.index]}Page {self.index + 1}/{total}"
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.exhausted and self.index >= len(self.pages) - 1
+
+    async def show(self, interaction: discord.Interaction, index: int):
+        if await self.get_page(index) is not None:
+            self.index = index
+
+        self.update_buttons()
+        await interaction.response.edit_message(content=self.format_page(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.index - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.index + 1)
+
+    async def send(self, raw: discord.Message) -> bool:
+        # replies with the first page, returns False if there is nothing to show
+        if await self.get_page(0) is None:
+            return False
+
+        self.update_buttons()
+        self.message = await raw.reply(self.format_page(), view=self)
+        return True
+
+    async def on_timeout(self):
+        if self.message is not None:
+            await self.message.edit(view=None)
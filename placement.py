@@ -0,0 +1,196 @@
+import datetime
+from collections import Counter
+
+import farm
+
+
+SHAPES = ("fill", "/", "\\", "border", "mask")
+
+MASK_ROWS = ","  # mask rows are separated by this, e.g. 101,010,101
+MASK_SET = "1x#"  # squares of the mask that get planted, anything else is left alone
+
+
+class PlacementError(Exception):
+    # the message is sent back to the user as is, nothing has been changed when this is raised
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+def check_bounds(width: int, height: int, start_x: int, start_y: int, end_x: int, end_y: int):
+    if start_x >= width or start_x < 0:
+        raise PlacementError(f"Start position {start_x} (x) is out of bounds!")
+
+    if start_y >= height or start_y < 0:
+        raise PlacementError(f"Start position {start_y} (y) is out of bounds!")
+
+    if end_x >= width or end_x < 0:
+        raise PlacementError(f"End position {end_x} (x) is out of bounds!")
+
+    if end_y >= height or end_y < 0:
+        raise PlacementError(f"End position {end_y} (y) is out of bounds!")
+
+
+def get_indexes(shape: str, width: int, start_x: int, start_y: int, end_x: int, end_y: int, mask: str = None) -> list[int]:
+    # squares of the shape inside the rectangle spanned by both corners, in either order
+    # "\\" runs from the top left to the bottom right corner, "/" from the bottom left to the top right one
+    left, right = min(start_x, end_x), max(start_x, end_x)
+    top, bottom = min(start_y, end_y), max(start_y, end_y)
+
+    if shape == "fill":
+        return [y * width + x for y in range(top, bottom + 1) for x in range(left, right + 1)]
+
+    if shape == "border":
+        return [y * width + x for y in range(top, bottom + 1) for x in range(left, right + 1)
+                if y in (top, bottom) or x in (left, right)]
+
+    if shape in ("/", "\\"):
+        steps = max(right - left, bottom - top)
+        squares = {}
+
+        for step in range(steps + 1):
+            x = left + round(step * (right - left) / steps) if steps else left
+            y = top + round(step * (bottom - top) / steps) if steps else top
+            squares[(y if shape == "\\" else top + bottom - y) * width + x] = None
+
+        return list(squares)
+
+    if shape == "mask":
+        if not mask:
+            raise PlacementError(f"Please provide a mask like 101{MASK_ROWS}010 for the mask mode!")
+
+        rows = mask.split(MASK_ROWS)
+
+        if len(rows) != bottom - top + 1 or any(len(row) != right - left + 1 for row in rows):
+            raise PlacementError(f"The mask has to be {right - left + 1} wide and {bottom - top + 1} high!")
+
+        return [(top + dy) * width + left + dx for dy, row in enumerate(rows) for dx, square in enumerate(row) if square in MASK_SET]
+
+    raise PlacementError(f"{shape} not in place mode, available: {list(SHAPES)}")
+
+
+class Plan:
+    # everything placing `harvest` on `indexes` costs and gives back, computed in one pass without touching the farm
+
+    def __init__(self, harvest: farm.Harvests, indexes: list[int], changed: list[int], used: int, cost: int, refund: Counter):
+        self.harvest = harvest
+        self.indexes = indexes
+        self.changed = changed  # squares that don't already hold the harvest
+        self.used = used  # taken from the inventory
+        self.cost = cost  # money for the rest
+        self.refund = refund  # item -> amount stored back from overwritten squares
+
+    def describe(self) -> str:
+        return describe(self)
+
+
+def describe(*plans: Plan) -> str:
+    # what the plans take and give back together, for the replies
+    parts = [f"{sum(len(p.changed) for p in plans)} of {sum(len(p.indexes) for p in plans)} squares"]
+    parts += [f":{p.harvest.name.lower()}:-{p.used}" for p in plans if p.used]
+
+    cost = sum(p.cost for p in plans)
+
+    if cost:
+        parts.append(f":moneybag:-{cost}")
+
+    refund = Counter()
+    for p in plans:
+        refund.update(p.refund)
+
+    parts += [f":{name}:+{amount}" for name, amount in refund.items()]
+
+    return ", ".join(parts)
+
+
+def plan(f: farm.Farm, harvest: farm.Harvests, indexes: list[int], free=False, harvests: dict = None) -> Plan:
+    # same rules as Farm.set_index: inventory first, money for the rest, overwritten squares go back to the inventory
+    # harvests: the inventory to plan against, defaults to the farm's, see settle() for plans that follow each other
+    if harvests is None:
+        harvests = f.harvests
+
+    if harvest.value.plantable in (farm.Plantable.NOT_PLANTABLE, farm.Plantable.UNOBTAINABLE):
+        raise PlacementError(f"{harvest.name.lower()} can not be placed!")
+
+    code = farm.CODE_OF[harvest]
+    codes = f.farm.codes
+    changed = [i for i in indexes if codes[i] != code]
+
+    refund = Counter()
+
+    if not free:
+        for old, amount in Counter(codes[i] for i in changed).items():
+            if farm.CODES[old] != farm.Harvests.GREEN_SQUARE:
+                refund[farm.CODES[old].name.lower()] = amount
+
+    used = 0 if free else min(max(harvests.get(harvest.name.lower(), 0), 0), len(changed))
+    cost = 0 if free else (len(changed) - used) * harvest.value.price
+
+    return Plan(harvest, indexes, changed, used, cost, refund)
+
+
+def settle(harvests: dict, placement: Plan):
+    # pays for the plan and stores its refund in `harvests`, raises without touching it if the money isn't enough
+    money = harvests.get("moneybag", 0)
+
+    if placement.cost > money:
+        raise PlacementError(f"You don't have enough money to place that! ({placement.cost} needed, you only have {money}:moneybag:)")
+
+    if placement.cost:
+        harvests["moneybag"] = money - placement.cost
+
+    if placement.used:
+        harvests[placement.harvest.name.lower()] -= placement.used
+
+    for name, amount in placement.refund.items():
+        harvests[name] = harvests.get(name, 0) + amount
+
+
+def apply(f: farm.Farm, *plans: Plan):
+    # all or nothing, raises before anything is changed if the money isn't enough
+    # plans are paid one after another, like Farm.set_index square by square, so refunds of one pay for the next
+    harvests = dict(f.harvests)
+
+    for placement in plans:
+        settle(harvests, placement)
+
+    f.harvests.update(harvests)
+
+    now = int(datetime.datetime.now().timestamp())
+    codes = f.farm.codes
+    planted = f.farm.planted
+    changed = 0
+
+    for placement in plans:
+        code = farm.CODE_OF[placement.harvest]
+
+        for i in placement.changed:
+            codes[i] = code
+            planted[i] = now
+
+        changed += len(placement.changed)
+
+    if changed > 8:
+        f.invalidate()
+    else:
+        for placement in plans:
+            for i in placement.changed:
+                f.invalidate(i)
+
+
+def place(f: farm.Farm, shape: str, start_x: int, start_y: int, end_x: int, end_y: int, harvest: farm.Harvests,
+          mask: str = None, free=False, dry_run=False) -> Plan:
+    # free: nothing is paid or stored back, dry_run: only works out the plan
+    if shape not in SHAPES:
+        raise PlacementError(f"{shape} not in place mode, available: {list(SHAPES)}")
+
+    width, height = f.get_farm_length_from_level(f.level)
+    check_bounds(width, height, start_x, start_y, end_x, end_y)
+
+    placement = plan(f, harvest, get_indexes(shape, width, start_x, start_y, end_x, end_y, mask), free)
+
+    if not dry_run:
+        apply(f, placement)
+
+    return placement
@@ -0,0 +1,123 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import tracemalloc
+from datetime import datetime
+
+
+class Profiler:
+    # cProfile and tracemalloc that can be switched on and off while the bot is running
+    # profiles and snapshots are written to `directory`, summaries are returned as text
+
+    def __init__(self, directory="profiles", top=20):
+        self.directory = directory
+        self.top = top
+
+        self.profile: cProfile.Profile | None = None
+        self.remaining: int | None = None  # commands left before the profile is done, None if it runs by time
+        self.done = asyncio.Event()
+
+        self.baseline: tracemalloc.Snapshot | None = None
+
+    def is_running(self) -> bool:
+        return self.profile is not None
+
+    def get_filename(self, kind: str, extension: str) -> str:
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+
+        return os.path.join(self.directory, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.{extension}")
+
+    def start(self, commands: int = None) -> bool:
+        # returns False if a profile is already running
+        if self.profile is not None:
+            return False
+
+        self.remaining = commands
+        self.done = asyncio.Event()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+        return True
+
+    def command_finished(self):
+        if self.profile is None or self.remaining is None:
+            return
+
+        self.remaining -= 1
+
+        if self.remaining <= 0:
+            self.done.set()
+
+    async def wait(self, seconds: float = None):
+        # until the command count is reached, the time is up or stop() was called
+        try:
+            await asyncio.wait_for(self.done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def stop(self) -> tuple[str, str] | None:
+        # stops profiling, returns the .prof filename and the top functions by cumulative time
+        if self.profile is None:
+            return None
+
+        profile = self.profile
+        profile.disable()
+        self.profile = None
+        self.remaining = None
+        self.done.set()
+
+        filename = self.get_filename("profile", "prof")
+        profile.dump_stats(filename)
+
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).strip_dirs().sort_stats("cumulative").print_stats(self.top)
+
+        return filename, summary.getvalue()
+
+    def toggle(self) -> tuple[str, str] | None:
+        # for the signal handler, starts an open ended profile or stops the running one
+        if self.profile is None:
+            self.start()
+            return None
+
+        return self.stop()
+
+    def start_tracing(self, frames=1) -> bool:
+        if tracemalloc.is_tracing():
+            return False
+
+        tracemalloc.start(frames)
+        self.baseline = tracemalloc.take_snapshot()
+
+        return True
+
+    def snapshot(self, top: int = None) -> tuple[str, str] | None:
+        # writes a tracemalloc snapshot, summary is the growth since start_tracing by line
+        if not tracemalloc.is_tracing():
+            return None
+
+        snapshot = tracemalloc.take_snapshot()
+        filename = self.get_filename("memory", "snapshot")
+        snapshot.dump(filename)
+
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB"]
+
+        for stat in snapshot.compare_to(self.baseline, "lineno")[:top or self.top]:
+            lines.append(str(stat))
+
+        return filename, "\n".join(lines)
+
+    def stop_tracing(self) -> bool:
+        if not tracemalloc.is_tracing():
+            return False
+
+        tracemalloc.stop()
+        self.baseline = None
+
+        return True
@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import time
+
+import farm
+
+
+class HarvestScheduler:
+    # knows when every crop of every farm is ready without loading the farms
+    # a min-heap of (ready timestamp, user_id, crop) drives one sleeping task that only wakes when the next crop is due,
+    # everything due by then is handed to on_ready in one batch
+    # only crops that become ready while the bot runs are announced, not the ones that already are
+
+    def __init__(self, on_ready=None, on_error=None):
+        self.on_ready = on_ready  # async callable(dict user_id -> list of crops), once per sweep
+        self.on_error = on_error  # callable(due, exception), called inside the except block, the scheduler keeps running
+        self.ready: dict[int, dict[str, float]] = {}  # user_id -> crop -> timestamp
+        self.next_ready: dict[int, float] = {}  # user_id -> earliest crop, so "when is my farm ready" is one lookup
+        self.heap: list[tuple[float, int, str]] = []  # may hold outdated entries, they are skipped when popped
+
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def from_store(cls, store, on_ready=None, on_error=None):
+        # store: anything with iter_ready(), the sqlite store keeps the times in their own table
+        scheduler = cls(on_ready, on_error)
+
+        for user_id, ready in store.iter_ready():
+            scheduler.update(user_id, ready)
+
+        return scheduler
+
+    def update(self, user_id: int, ready: dict):
+        old = self.ready.get(user_id, {})
+        now = time.time()
+        first = self.heap[0][0] if self.heap else None
+
+        if ready:
+            self.ready[user_id] = ready
+            self.next_ready[user_id] = min(ready.values())
+        else:
+            self.ready.pop(user_id, None)
+            self.next_ready.pop(user_id, None)
+
+        for crop, timestamp in ready.items():
+            # unchanged times are already queued (or announced), past ones are not news
+            if old.get(crop) != timestamp and timestamp > now:
+                heapq.heappush(self.heap, (timestamp, user_id, crop))
+
+        if self.heap and (first is None or self.heap[0][0] < first):
+            self.wakeup.set()
+
+        if len(self.heap) > 64 and len(self.heap) > 4 * len(self.ready):
+            self.compact(now)
+
+    def update_farm(self, user_id: int, f: farm.Farm):
+        self.update(user_id, f.get_ready_times())
+
+    def compact(self, now: float):
+        # drops the outdated entries, everything still waiting is in self.ready
+        self.heap = [(timestamp, user_id, crop) for user_id, ready in self.ready.items()
+                     for crop, timestamp in ready.items() if timestamp > now]
+        heapq.heapify(self.heap)
+
+    def get_next_ready(self, user_id: int) -> float | None:
+        # timestamp from which the first crop of the farm can be harvested, None for unknown farms or farms without crops
+        return self.next_ready.get(user_id)
+
+    def get_ready_times(self, user_id: int) -> dict:
+        return self.ready.get(user_id, {})
+
+    def pop_due(self, now: float) -> dict[int, list[str]]:
+        due = {}
+
+        while self.heap and self.heap[0][0] <= now:
+            timestamp, user_id, crop = heapq.heappop(self.heap)
+
+            if self.ready.get(user_id, {}).get(crop) != timestamp:
+                continue  # harvested, replaced or moved since it was queued
+
+            due.setdefault(user_id, []).append(crop)
+
+        return due
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            delay = self.heap[0][0] - time.time() if self.heap else None
+
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due = self.pop_due(time.time())
+
+            if due and self.on_ready is not None:
+                try:
+                    await self.on_ready(due)
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(due, e)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name="harvest-scheduler")
+
+    async def close(self):
+        if self.task is None:
+            return
+
+        self.task.cancel()
+
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+        self.task = None
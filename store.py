@@ -0,0 +1,602 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import farm
+from blueprints import Blueprint
+
+
+class FarmStore:
+    # base class for everything that can hold farms, keyed by discord user id
+
+    def load(self, user_id: int) -> farm.Farm | None:
+        raise NotImplementedError
+
+    def save(self, user_id: int, f: farm.Farm):
+        raise NotImplementedError
+
+    def exists(self, user_id: int) -> bool:
+        return self.load(user_id) is not None
+
+    def get_cached(self, user_id: int) -> farm.Farm | None:
+        # farms that can be handed out without touching the disk, see FarmCache
+        return None
+
+    def user_ids(self) -> list[int]:
+        raise NotImplementedError
+
+    def user_ids_after(self, after: int, limit: int) -> list[int]:
+        # the next `limit` user ids bigger than `after`, in order, for paging through every farm
+        return sorted(user_id for user_id in self.user_ids() if user_id > after)[:limit]
+
+    def iter_stats(self):
+        # (user_id, Farm.get_stats()) for every farm, stores that keep the stats around override this
+        for user_id in self.user_ids():
+            f = self.load(user_id)
+
+            if f is not None:
+                yield user_id, f.get_stats()
+
+    def iter_ready(self):
+        # (user_id, Farm.get_ready_times()) for every farm, for the harvest scheduler
+        for user_id in self.user_ids():
+            f = self.load(user_id)
+
+            if f is not None:
+                yield user_id, f.get_ready_times()
+
+    # blueprints are saved farm regions, by name and shared between every user
+
+    def load_blueprint(self, name: str) -> Blueprint | None:
+        raise NotImplementedError
+
+    def save_blueprint(self, blueprint: Blueprint):
+        raise NotImplementedError
+
+    def delete_blueprint(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def list_blueprints(self) -> list[tuple[str, int]]:
+        # (name, owner) of every blueprint, by name
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class JsonFarmStore(FarmStore):
+    # the old layout, one farms/<user_id>.json per farm
+
+    def __init__(self, directory="farms"):
+        self.directory = directory
+
+        try:
+            os.mkdir(self.directory)
+        except FileExistsError:
+            pass
+
+    def get_filename(self, user_id: int) -> str:
+        return os.path.join(self.directory, str(user_id) + '.json')
+
+    def get_blueprint_filename(self, name: str) -> str:
+        return os.path.join(self.directory, "blueprints", name + '.json')
+
+    def load(self, user_id: int) -> farm.Farm | None:
+        f = farm.Farm()
+
+        try:
+            f.load(self.get_filename(user_id))
+        except FileNotFoundError:
+            return None
+
+        return f
+
+    def save(self, user_id: int, f: farm.Farm):
+        f.save(self.get_filename(user_id))
+
+    def exists(self, user_id: int) -> bool:
+        return os.path.isfile(self.get_filename(user_id))
+
+    def user_ids(self) -> list[int]:
+        res = []
+
+        for filename in os.listdir(self.directory):
+            user_id, ext = os.path.splitext(filename)
+
+            if ext == '.json' and user_id.isdecimal():
+                res.append(int(user_id))
+
+        return res
+
+
+    def load_blueprint(self, name: str) -> Blueprint | None:
+        try:
+            with open(self.get_blueprint_filename(name), "r") as f:
+                return Blueprint.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save_blueprint(self, blueprint: Blueprint):
+        os.makedirs(os.path.join(self.directory, "blueprints"), exist_ok=True)
+
+        with open(self.get_blueprint_filename(blueprint.name), "w") as f:
+            f.write(json.dumps(blueprint.to_dict()))
+
+    def delete_blueprint(self, name: str) -> bool:
+        try:
+            os.remove(self.get_blueprint_filename(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list_blueprints(self) -> list[tuple[str, int]]:
+        try:
+            filenames = sorted(os.listdir(os.path.join(self.directory, "blueprints")))
+        except FileNotFoundError:
+            return []
+
+        res = []
+
+        for filename in filenames:
+            name, ext = os.path.splitext(filename)
+
+            if ext == '.json':
+                res.append((name, self.load_blueprint(name).owner))
+
+        return res
+
+
+class SqliteFarmStore(FarmStore):
+    # every farm is one row in a single sqlite database, commits are batched
+    # rows are in the binary farm format, json rows from older versions are still read
+
+    def __init__(self, filename="farms.db", batch_size=32, commit_interval=1.0):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval  # seconds an uncommitted save may wait at most
+
+        self.created = not os.path.isfile(self.filename)
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS farms ("
+                                "user_id INTEGER PRIMARY KEY, "  # rowid alias, so lookups by user id are indexed
+                                "data BLOB NOT NULL, "
+                                "updated REAL NOT NULL)")
+        schedule_created = not self.has_table("schedule")
+
+        self.connection.execute("CREATE TABLE IF NOT EXISTS stats ("
+                                "user_id INTEGER PRIMARY KEY, "
+                                "level INTEGER NOT NULL, "
+                                "moneybag INTEGER NOT NULL, "
+                                "inventory INTEGER NOT NULL, "
+                                "tiles INTEGER NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS schedule ("  # when every crop of a farm is ready
+                                "user_id INTEGER NOT NULL, "
+                                "crop TEXT NOT NULL, "
+                                "ready REAL NOT NULL, "
+                                "PRIMARY KEY (user_id, crop))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blueprints ("
+                                "name TEXT PRIMARY KEY, "
+                                "owner INTEGER NOT NULL, "
+                                "data BLOB NOT NULL, "  # Blueprint.to_bytes(), run length encoded
+                                "updated REAL NOT NULL)")
+        self.connection.commit()
+
+        self.pending = 0
+        self.last_commit = time.monotonic()
+
+        if self.count("stats") < self.count("farms"):  # database from before the stats table existed
+            self.rebuild_stats()
+
+        if schedule_created and not self.created:  # database from before the schedule table existed
+            self.rebuild_schedule()
+
+    def load(self, user_id: int) -> farm.Farm | None:
+        with self.lock:
+            row = self.connection.execute("SELECT data FROM farms WHERE user_id = ?", (user_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        f = farm.Farm()
+
+        if isinstance(row[0], bytes) and row[0].startswith(farm.FORMAT_MAGIC):
+            f.from_bytes(row[0])
+        else:
+            f.from_dict(json.loads(row[0]))
+
+        return f
+
+    def save(self, user_id: int, f: farm.Farm):
+        data = f.to_bytes()
+
+        with self.lock:
+            self.connection.execute("INSERT INTO farms (user_id, data, updated) VALUES (?, ?, ?) "
+                                    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                                    (user_id, data, time.time()))
+            self.save_stats(user_id, f.get_stats())
+            self.save_ready(user_id, f.get_ready_times())
+            self.pending += 1
+
+            if self.pending >= self.batch_size or time.monotonic() - self.last_commit >= self.commit_interval:
+                self.commit()
+
+    def exists(self, user_id: int) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM farms WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def user_ids(self) -> list[int]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT user_id FROM farms ORDER BY user_id")]
+
+    def user_ids_after(self, after: int, limit: int) -> list[int]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT user_id FROM farms WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                                                              (after, limit))]
+
+    def save_stats(self, user_id: int, stats: dict):
+        self.connection.execute("INSERT OR REPLACE INTO stats (user_id, level, moneybag, inventory, tiles) VALUES (?, ?, ?, ?, ?)",
+                                (user_id, stats["level"], stats["moneybag"], stats["inventory"], stats["tiles"]))
+
+    def save_ready(self, user_id: int, ready: dict):
+        self.connection.execute("DELETE FROM schedule WHERE user_id = ?", (user_id,))
+        self.connection.executemany("INSERT INTO schedule (user_id, crop, ready) VALUES (?, ?, ?)",
+                                    [(user_id, crop, timestamp) for crop, timestamp in ready.items()])
+
+    def has_table(self, table: str) -> bool:
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                           (table,)).fetchone() is not None
+
+    def count(self, table: str) -> int:
+        with self.lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def rebuild_stats(self):
+        with self.lock:
+            for user_id in self.user_ids():
+                self.save_stats(user_id, self.load(user_id).get_stats())
+            self.commit()
+
+    def load_blueprint(self, name: str) -> Blueprint | None:
+        with self.lock:
+            row = self.connection.execute("SELECT owner, data FROM blueprints WHERE name = ?", (name,)).fetchone()
+
+        return Blueprint.from_bytes(name, row[0], row[1]) if row is not None else None
+
+    def save_blueprint(self, blueprint: Blueprint):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO blueprints (name, owner, data, updated) VALUES (?, ?, ?, ?)",
+                                    (blueprint.name, blueprint.owner, blueprint.to_bytes(), time.time()))
+            self.commit()
+
+    def delete_blueprint(self, name: str) -> bool:
+        with self.lock:
+            deleted = self.connection.execute("DELETE FROM blueprints WHERE name = ?", (name,)).rowcount > 0
+            self.commit()
+
+        return deleted
+
+    def list_blueprints(self) -> list[tuple[str, int]]:
+        with self.lock:
+            return self.connection.execute("SELECT name, owner FROM blueprints ORDER BY name").fetchall()
+
+    def rebuild_schedule(self):
+        with self.lock:
+            for user_id in self.user_ids():
+                self.save_ready(user_id, self.load(user_id).get_ready_times())
+            self.commit()
+
+    def iter_stats(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT user_id, level, moneybag, inventory, tiles FROM stats").fetchall()
+
+        for user_id, level, moneybag, inventory, tiles in rows:
+            yield user_id, {"level": level, "moneybag": moneybag, "inventory": inventory, "tiles": tiles}
+
+    def iter_ready(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT user_id, crop, ready FROM schedule ORDER BY user_id").fetchall()
+
+        ready = {}
+
+        for user_id, crop, timestamp in rows:
+            ready.setdefault(user_id, {})[crop] = timestamp
+
+        yield from ready.items()
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+            self.pending = 0
+            self.last_commit = time.monotonic()
+
+    def flush(self):
+        self.commit()
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.connection.close()
+
+
+class FarmCache(FarmStore):
+    # keeps hot farms in memory in front of another store
+    # saves only mark the farm dirty, a background thread writes them to the backing store
+
+    def __init__(self, store: FarmStore, max_entries=1024, max_tiles=None, flush_interval=5.0, on_error=None):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_tiles = max_tiles  # rough memory cap, a farm costs about one list slot per tile
+        self.flush_interval = flush_interval
+        self.on_error = on_error  # callable(exception) for failed background flushes, called inside the except block
+
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()  # keeps writes to the backing store in order
+        self.entries: OrderedDict[int, farm.Farm] = OrderedDict()
+        self.sizes: dict[int, int] = {}
+        self.tiles = 0
+        self.dirty: dict[int, farm.Farm] = {}  # snapshots waiting to be written, evicted farms stay here until flushed
+        self.flushing: dict[int, farm.Farm] = {}  # snapshots currently being written
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0  # snapshots written to the backing store
+
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self.run_flusher, name="farm-cache-flusher", daemon=True)
+        self.flusher.start()
+
+    def load(self, user_id: int) -> farm.Farm | None:
+        with self.lock:
+            f = self.entries.get(user_id)
+
+            if f is not None:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return f
+
+            self.misses += 1
+
+            snapshot = self.dirty.get(user_id) or self.flushing.get(user_id)
+
+        f = snapshot.copy() if snapshot is not None else self.store.load(user_id)
+
+        if f is None:
+            return None
+
+        with self.lock:
+            if user_id in self.entries:  # somebody else loaded it meanwhile, keep theirs
+                return self.entries[user_id]
+
+            self.put(user_id, f)
+            self.evict()
+
+        return f
+
+    def get_cached(self, user_id: int) -> farm.Farm | None:
+        with self.lock:
+            f = self.entries.get(user_id)
+
+            if f is not None:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+
+            return f
+
+    def save(self, user_id: int, f: farm.Farm):
+        with self.lock:
+            self.put(user_id, f)
+            self.dirty[user_id] = f.copy()
+            self.evict()
+
+    def exists(self, user_id: int) -> bool:
+        with self.lock:
+            if user_id in self.entries or user_id in self.dirty or user_id in self.flushing:
+                return True
+
+        return self.store.exists(user_id)
+
+    def user_ids(self) -> list[int]:
+        with self.lock:
+            cached = list(self.dirty) + list(self.flushing)
+
+        return sorted(set(self.store.user_ids()).union(cached))
+
+    def user_ids_after(self, after: int, limit: int) -> list[int]:
+        with self.lock:
+            cached = [user_id for user_id in list(self.dirty) + list(self.flushing) if user_id > after]
+
+        return sorted(set(self.store.user_ids_after(after, limit)).union(cached))[:limit]
+
+    def iter_stats(self):
+        return self.store.iter_stats()
+
+    def iter_ready(self):
+        return self.store.iter_ready()
+
+    def load_blueprint(self, name: str) -> Blueprint | None:
+        return self.store.load_blueprint(name)
+
+    def save_blueprint(self, blueprint: Blueprint):
+        self.store.save_blueprint(blueprint)
+
+    def delete_blueprint(self, name: str) -> bool:
+        return self.store.delete_blueprint(name)
+
+    def list_blueprints(self) -> list[tuple[str, int]]:
+        return self.store.list_blueprints()
+
+    def put(self, user_id: int, f: farm.Farm):
+        self.tiles -= self.sizes.get(user_id, 0)
+        self.entries[user_id] = f
+        self.entries.move_to_end(user_id)
+        self.sizes[user_id] = len(f.farm)
+        self.tiles += self.sizes[user_id]
+
+    def evict(self):
+        while self.entries and (len(self.entries) > self.max_entries
+                                or (self.max_tiles is not None and self.tiles > self.max_tiles and len(self.entries) > 1)):
+            user_id, _ = self.entries.popitem(last=False)
+            self.tiles -= self.sizes.pop(user_id)
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                self.flushing = self.dirty
+                self.dirty = {}
+
+            try:
+                for user_id, snapshot in self.flushing.items():
+                    self.store.save(user_id, snapshot)
+
+                self.store.flush()
+            except Exception:
+                # nothing counts as written, the snapshots go back unless a newer save is already waiting
+                with self.lock:
+                    for user_id, snapshot in self.flushing.items():
+                        self.dirty.setdefault(user_id, snapshot)
+                    self.flushing = {}
+                raise
+
+            with self.lock:
+                self.writes += len(self.flushing)
+                self.flushing = {}
+
+    def run_flusher(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "tiles": self.tiles,
+                "dirty": len(self.dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate(),
+                "writes": self.writes
+            }
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        self.flush()
+        self.store.close()
+
+
+class AsyncFarmStore:
+    # awaitable front for a FarmStore, the blocking work runs on a small thread pool
+    # so the event loop (and the gateway heartbeat) never waits for the disk
+
+    def __init__(self, store: FarmStore, max_workers=4):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="farm-io")
+        self.on_save = []  # callables(user_id, farm), run on the event loop after every save
+        self.timings = None  # callable(operation, ms), gets the awaited time of every operation
+
+    async def run(self, operation: str, func, *args):
+        start = time.perf_counter()
+        result = await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+        if self.timings is not None:
+            self.timings(operation, (time.perf_counter() - start) * 1000)
+
+        return result
+
+    async def load(self, user_id: int) -> farm.Farm | None:
+        start = time.perf_counter()
+        f = self.store.get_cached(user_id)
+
+        if f is not None:
+            if self.timings is not None:
+                self.timings("load (cached)", (time.perf_counter() - start) * 1000)
+            return f
+
+        return await self.run("load", self.store.load, user_id)
+
+    async def save(self, user_id: int, f: farm.Farm):
+        await self.run("save", self.store.save, user_id, f)
+
+        for callback in self.on_save:
+            callback(user_id, f)
+
+    async def exists(self, user_id: int) -> bool:
+        return await self.run("exists", self.store.exists, user_id)
+
+    async def user_ids(self) -> list[int]:
+        return await self.run("user_ids", self.store.user_ids)
+
+    async def user_ids_after(self, after: int, limit: int) -> list[int]:
+        return await self.run("user_ids_after", self.store.user_ids_after, after, limit)
+
+    async def load_blueprint(self, name: str) -> Blueprint | None:
+        return await self.run("load_blueprint", self.store.load_blueprint, name)
+
+    async def save_blueprint(self, blueprint: Blueprint):
+        await self.run("save_blueprint", self.store.save_blueprint, blueprint)
+
+    async def delete_blueprint(self, name: str) -> bool:
+        return await self.run("delete_blueprint", self.store.delete_blueprint, name)
+
+    async def list_blueprints(self) -> list[tuple[str, int]]:
+        return await self.run("list_blueprints", self.store.list_blueprints)
+
+    async def load_many(self, user_ids: list[int], concurrency=8) -> list[tuple[int, farm.Farm]]:
+        # loads farms concurrently, at most `concurrency` at a time, missing farms are skipped
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load_one(user_id):
+            async with semaphore:
+                return user_id, await self.load(user_id)
+
+        loaded = await asyncio.gather(*(load_one(user_id) for user_id in user_ids))
+
+        return [(user_id, f) for user_id, f in loaded if f is not None]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.store.close()
+
+
+def import_json_directory(store: FarmStore, directory="farms") -> int:
+    # one-shot migration from the json layout, returns how many farms were imported
+
+    if not os.path.isdir(directory):
+        return 0
+
+    source = JsonFarmStore(directory)
+    imported = 0
+
+    for user_id in source.user_ids():
+        f = source.load(user_id)
+
+        if f is None:
+            continue
+
+        store.save(user_id, f)
+        imported += 1
+
+    store.flush()
+
+    return imported